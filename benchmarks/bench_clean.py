@@ -0,0 +1,94 @@
+"""
+Markdown 清洗基准：对照逐步 re.sub 的旧实现，校验 clean_markdown_text 输出逐字节一致并比较耗时
+
+用法：python benchmarks/bench_clean.py [--docs 3000] [--repeat 5]
+"""
+import os
+import re
+import sys
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from diary_stats import clean_markdown_text  # noqa: E402
+
+
+def legacy_clean_markdown_text(markdown_text):
+    """优化前的实现，作为对照基准"""
+    markdown_text = re.sub(r'<[^>]+>', '', markdown_text)
+    markdown_text = re.sub(r'!\[.*?\]\(.*?\)', '', markdown_text)
+    markdown_text = re.sub(r'\[([^\]]+)\]\(https?://[^\)]+\)', r'\1', markdown_text)
+    markdown_text = re.sub(r'https?://[^\s\)]+', '', markdown_text)
+    markdown_text = re.sub(r'\n{3,}', '\n\n', markdown_text)
+    return markdown_text.strip()
+
+
+# 各步骤相互影响的边界情况
+FIXTURES = [
+    "",
+    "   \n\n",
+    "# 20250716\n\n## 今日计划\n- 今天我完成了哪些事情？",
+    "<b>加粗</b> 和 <br/> 换行 <不闭合",
+    "![图片](http://a.com/x.png) 图后文字 ![](local.png)",
+    "![a](<b>x)",
+    "[链接文字](https://example.com/path) 后面",
+    "[te<i>x</i>t](https://example.com)",
+    "[http://a.com](http://b.com)",
+    "http://a.com![x](y)",
+    "裸链接 https://example.com/a?b=1)后缀 http://x.y",
+    "[不是链接](local.md) [空]() [](https://a.b)",
+    "a\n\n\nb\n\n\n\n\nc\r\n\r\n\r\nd",
+    "![跨\n行](url) [跨\n行](https://a.b)",
+    "<a href=\"https://a.b\">[x](https://c.d)</a>\n\n\n\n",
+]
+
+SNIPPETS = ["今天天气很好，我们一起去公园散步。", "Worked on some Python code today.",
+            "![photo](https://img.example.com/p.jpg)", "[日记](https://blog.example.com/post)",
+            "<span style=\"color:red\">重点</span>", "参考 https://docs.python.org/3/ 文档", "\n\n\n\n", "\n"]
+
+
+def make_docs(count):
+    random.seed(7)
+    docs = list(FIXTURES)
+    for _ in range(count):
+        docs.append("".join(random.choice(SNIPPETS) for _ in range(random.randint(20, 200))))
+    # 不含任何标记的纯文本日记最常见
+    for _ in range(count):
+        docs.append("\n".join(random.choice(SNIPPETS[:2]) for _ in range(random.randint(20, 200))))
+    return docs
+
+
+def bench(func, docs, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        for doc in docs:
+            func(doc)
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--docs", type=int, default=3000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    docs = make_docs(args.docs)
+    for doc in docs:
+        expected = legacy_clean_markdown_text(doc)
+        actual = clean_markdown_text(doc)
+        assert actual.encode("utf-8") == expected.encode("utf-8"), f"输出不一致: {doc[:80]!r}"
+    print(f"{len(docs)} 篇输出与旧实现逐字节一致")
+
+    total_mb = sum(len(doc.encode("utf-8")) for doc in docs) / 1024 / 1024
+    legacy = bench(legacy_clean_markdown_text, docs, args.repeat)
+    current = bench(clean_markdown_text, docs, args.repeat)
+    print(f"旧实现  {legacy:.3f}s  {total_mb / legacy:7.1f} MB/s")
+    print(f"新实现  {current:.3f}s  {total_mb / current:7.1f} MB/s  x{legacy / current:.2f}")
+
+
+if __name__ == "__main__":
+    main()
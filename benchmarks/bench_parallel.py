@@ -0,0 +1,62 @@
+"""
+并行分析基准：在临时目录生成合成日记，分别以 1/2/4/8 个进程分析，
+校验结果与串行完全一致并输出耗时与加速比
+
+用法：python benchmarks/bench_parallel.py [--days 1500] [--workers 1 2 4 8]
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from diary_stats import analyze_diary_files, load_stopwords  # noqa: E402
+
+WORDS = ["今天", "天气", "很好", "我们", "一起", "公园", "散步", "晚上", "火锅", "心情",
+         "工作", "学习", "读书", "电影", "朋友", "Python", "code", "review"]
+
+
+def make_corpus(root, days):
+    random.seed(42)
+    start = date(2015, 1, 1)
+    paths = []
+    for i in range(days):
+        day = start + timedelta(days=i)
+        month_dir = os.path.join(root, day.strftime("%Y"), day.strftime("%Y%m"))
+        os.makedirs(month_dir, exist_ok=True)
+        path = os.path.join(month_dir, day.strftime("%Y%m%d.md"))
+        lines = ["".join(random.choice(WORDS) for _ in range(random.randint(20, 60))) for _ in range(20)]
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(f"# {day:%Y%m%d}\n\n" + "\n".join(lines))
+        paths.append(path)
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--days", type=int, default=1500)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    args = parser.parse_args()
+
+    stopwords = load_stopwords()
+    with tempfile.TemporaryDirectory() as root:
+        paths = make_corpus(root, args.days)
+        baseline = None
+        baseline_time = None
+        for workers in args.workers:
+            t0 = time.perf_counter()
+            results = analyze_diary_files(paths, stopwords, workers=workers)
+            elapsed = time.perf_counter() - t0
+            if baseline is None:
+                baseline, baseline_time = results, elapsed
+            assert results == baseline, f"workers={workers} 的结果与串行不一致"
+            print(f"workers={workers:<2d} {elapsed:7.2f}s  {len(paths) / elapsed:8.1f} files/s  "
+                  f"speedup x{baseline_time / elapsed:.2f}")
+
+
+if __name__ == "__main__":
+    main()
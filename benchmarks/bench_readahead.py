@@ -0,0 +1,67 @@
+"""
+预读基准：模拟慢速文件系统（每次读取额外等待 --delay 毫秒，相当于网络盘的往返延迟），
+比较逐个读取再分词与线程预读两种方式的耗时，并校验两者结果完全一致
+
+用法：python benchmarks/bench_readahead.py [--years 1] [--delay 5] [--threads 4] [--depth 32]
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from corpus import generate_corpus  # noqa: E402
+from diary_reader import read_ahead, read_file_bytes  # noqa: E402
+from diary_stats import analyze_diary_text, load_stopwords  # noqa: E402
+from diary_tokenizer import STATS_TOKENIZER, ensure_jieba_initialized  # noqa: E402
+
+
+def delayed_reader(delay):
+    def reader(path):
+        # sleep 会释放 GIL，与真实的阻塞 I/O 一样
+        time.sleep(delay)
+        return read_file_bytes(path)
+    return reader
+
+
+def run(paths, stopwords, reader, threads, depth):
+    # 清空段落分词缓存，两种方式都从冷缓存开始
+    cache_clear = getattr(STATS_TOKENIZER._tokenize_paragraph, 'cache_clear', None)
+    if cache_clear:
+        cache_clear()
+    t0 = time.perf_counter()
+    results = [analyze_diary_text(text, stopwords) if text is not None else None
+               for _, text, _ in read_ahead(paths, threads=threads, depth=depth, reader=reader)]
+    return results, time.perf_counter() - t0
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--years", type=int, default=1)
+    parser.add_argument("--delay", type=float, default=5.0, help="每次读取的额外延迟（毫秒）")
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--depth", type=int, default=32)
+    args = parser.parse_args()
+
+    stopwords = load_stopwords()
+    ensure_jieba_initialized()
+    with tempfile.TemporaryDirectory() as root:
+        info = generate_corpus(root, years=args.years)
+        paths = sorted(os.path.join(dirpath, f) for dirpath, _, files in os.walk(root) for f in files)
+        reader = delayed_reader(args.delay / 1000)
+        print(f"{info['files']} 篇，{info['bytes'] / 1024 / 1024:.1f} MB，每次读取延迟 {args.delay} ms")
+
+        baseline, serial = run(paths, stopwords, reader, 0, 0)
+        print(f"逐个读取      {serial:7.2f}s  {len(paths) / serial:8.1f} files/s")
+        results, elapsed = run(paths, stopwords, reader, args.threads, args.depth)
+        assert results == baseline, "预读结果与逐个读取不一致"
+        print(f"预读 {args.threads} 线程/{args.depth:<3d} {elapsed:7.2f}s  {len(paths) / elapsed:8.1f} files/s  "
+              f"x{serial / elapsed:.2f}")
+        io_only = len(paths) * args.delay / 1000
+        print(f"其中单纯的读取延迟合计 {io_only:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,223 @@
+"""
+综合基准：在临时目录生成合成日记库，依次测量
+清洗、分词、冷扫描、热扫描、单月查询、区间对比、词云渲染、单篇创建和批量创建，
+输出耗时、吞吐量（files/s、MB/s）和 Python 堆内存峰值（tracemalloc），可保存为 JSON 以便长期对比
+
+用法：python benchmarks/bench_suite.py [--years 3] [--repeat 3] [--only cold_scan warm_scan] [--json out.json]
+注意：tracemalloc 只统计当前进程，冷扫描默认用进程池分析，子进程的内存不计入；需要时可加 --workers 1
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import argparse
+import tempfile
+import tracemalloc
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import diary_index  # noqa: E402
+from corpus import DEFAULT_MIX, generate_corpus  # noqa: E402
+from diary_compare import compare_ranges  # noqa: E402
+from diary_stats import clean_markdown_text, collect_diary_data, collect_diary_data_multi, tokenize_text  # noqa: E402
+from diary_wordcloud import render_wordcloud, resolve_font_path  # noqa: E402
+from utils.file_utils import create_diary_entries, create_diary_entry  # noqa: E402
+
+TEMPLATE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "templates", "default.md")
+
+
+def reset_caches(root_path):
+    """删除根目录下的持久缓存并丢弃进程内的索引对象，使下一次扫描从零开始"""
+    shutil.rmtree(os.path.join(root_path, ".diary_cache"), ignore_errors=True)
+    with diary_index._indexes_lock:
+        diary_index._indexes.pop(os.path.abspath(root_path), None)
+
+
+def measure(name, run, setup=None, repeat=3, files=0, nbytes=0, memory=True):
+    """
+    运行 repeat 次取最短耗时（每次之前调用 setup），再单独跑一次 tracemalloc 统计内存峰值
+    计时的那几次不开启 tracemalloc，避免其开销混入耗时
+    """
+    times = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        t0 = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - t0)
+
+    peak_mb = None
+    if memory:
+        if setup:
+            setup()
+        tracemalloc.start()
+        try:
+            run()
+            peak_mb = tracemalloc.get_traced_memory()[1] / 1024 / 1024
+        finally:
+            tracemalloc.stop()
+
+    best = min(times)
+    return {
+        "name": name,
+        "seconds": round(best, 6),
+        "mean_seconds": round(sum(times) / len(times), 6),
+        "repeat": repeat,
+        "files": files,
+        "bytes": nbytes,
+        "files_per_s": round(files / best, 1) if files and best else None,
+        "mb_per_s": round(nbytes / 1024 / 1024 / best, 2) if nbytes and best else None,
+        "peak_mb": round(peak_mb, 2) if peak_mb is not None else None,
+    }
+
+
+def read_corpus(root_path):
+    docs = []
+    for dirpath, _, filenames in os.walk(root_path):
+        if ".diary_cache" in dirpath:
+            continue
+        for filename in filenames:
+            if filename.endswith(".md"):
+                with open(os.path.join(dirpath, filename), encoding="utf-8") as f:
+                    docs.append(f.read())
+    return docs
+
+
+def build_benchmarks(root_path, info, workers, work_dir):
+    """返回 [(名称, run, setup, 文件数, 字节数)]"""
+    docs = read_corpus(root_path)
+    cleaned = [clean_markdown_text(doc) for doc in docs]
+    corpus_bytes = sum(len(doc.encode("utf-8")) for doc in docs)
+    cleaned_bytes = sum(len(doc.encode("utf-8")) for doc in cleaned)
+
+    start, end = info["start"], info["end"]
+    mid = date(end.year, 6, 1)
+    month_end = date(mid.year, mid.month + 1, 1) - timedelta(days=1)
+    range_1 = (start, date(start.year, 12, 31))
+    range_2 = (date(end.year, 1, 1), end)
+
+    def files_between(s, e):
+        files = [f for f in diary_index.get_diary_index(root_path).query(s, e)]
+        return len(files), sum(f.size for f in files)
+
+    def scan():
+        collect_diary_data(root_path, workers=workers)
+
+    def month_query():
+        collect_diary_data(root_path, start_date=mid, end_date=month_end, workers=workers)
+
+    def compare_query():
+        collect_diary_data_multi(root_path, [range_1, range_2], workers=workers)
+        compare_ranges(root_path, range_1, range_2)
+
+    top_words = []
+
+    def wordcloud():
+        render_wordcloud(top_words, font_path=resolve_font_path()).to_array()
+
+    create_dirs = []
+
+    def fresh_dir():
+        path = tempfile.mkdtemp(dir=work_dir)
+        create_dirs.append(path)
+        return path
+
+    bulk_target = []
+
+    def bulk_setup():
+        bulk_target[:] = [fresh_dir()]
+
+    def bulk_create():
+        create_diary_entries(bulk_target[0], date(2020, 1, 1), date(2020, 12, 31), use_template=True,
+                             template_path=TEMPLATE_PATH)
+
+    entry_targets = []
+
+    def entry_setup():
+        entry_targets[:] = [fresh_dir() for _ in range(100)]
+
+    def create_entries():
+        for path in entry_targets:
+            create_diary_entry(path, use_template=True, template_path=TEMPLATE_PATH)
+
+    def warm_up():
+        # 热扫描及之后的查询都基于一次完整扫描后的缓存
+        result = collect_diary_data(root_path, workers=workers)
+        top_words[:] = result.get("word_freq", [])[:100]
+
+    month_files, month_bytes = files_between(mid, month_end)
+    compare_files = sum(files_between(*r)[0] for r in (range_1, range_2))
+    compare_bytes = sum(files_between(*r)[1] for r in (range_1, range_2))
+
+    return [
+        ("clean_markdown", lambda: [clean_markdown_text(doc) for doc in docs], None, len(docs), corpus_bytes),
+        ("tokenize", lambda: [tokenize_text(doc) for doc in cleaned], None, len(cleaned), cleaned_bytes),
+        ("cold_scan", scan, lambda: reset_caches(root_path), info["files"], info["bytes"]),
+        ("warm_scan", scan, warm_up, info["files"], info["bytes"]),
+        ("month_query", month_query, warm_up, month_files, month_bytes),
+        ("compare_query", compare_query, warm_up, compare_files, compare_bytes),
+        ("wordcloud_render", wordcloud, warm_up, 0, 0),
+        ("create_entry", create_entries, entry_setup, 100, 0),
+        ("bulk_create", bulk_create, bulk_setup, 366, 0),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="日记分析综合基准")
+    parser.add_argument("--years", type=int, default=3)
+    parser.add_argument("--min-chars", type=int, default=200)
+    parser.add_argument("--max-chars", type=int, default=1500)
+    parser.add_argument("--mix", type=int, nargs=4, default=list(DEFAULT_MIX), metavar=("ZH", "EN", "URL", "IMG"))
+    parser.add_argument("--no-boilerplate", action="store_true")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--workers", type=int, help="分析未命中缓存文件的进程数，默认 CPU 核数")
+    parser.add_argument("--only", nargs="+", help="只运行这些基准")
+    parser.add_argument("--no-memory", action="store_true", help="不统计内存峰值")
+    parser.add_argument("--json", help="把结果写入 JSON 文件")
+    args = parser.parse_args()
+
+    corpus_options = {
+        "years": args.years, "min_chars": args.min_chars, "max_chars": args.max_chars,
+        "mix": tuple(args.mix), "boilerplate": not args.no_boilerplate, "seed": args.seed,
+    }
+    results = []
+    with tempfile.TemporaryDirectory() as work_dir:
+        root_path = os.path.join(work_dir, "diaries")
+        t0 = time.perf_counter()
+        info = generate_corpus(root_path, **corpus_options)
+        print(f"合成日记库：{info['files']} 篇，{info['bytes'] / 1024 / 1024:.1f} MB，"
+              f"生成耗时 {time.perf_counter() - t0:.2f}s")
+
+        for name, run, setup, files, nbytes in build_benchmarks(root_path, info, args.workers, work_dir):
+            if args.only and name not in args.only:
+                continue
+            result = measure(name, run, setup, args.repeat, files, nbytes, not args.no_memory)
+            results.append(result)
+            throughput = "  ".join(
+                f"{value:>9} {unit}" for value, unit in
+                ((result["files_per_s"], "files/s"), (result["mb_per_s"], "MB/s")) if value is not None
+            )
+            peak = f"peak {result['peak_mb']:.1f} MB" if result["peak_mb"] is not None else ""
+            print(f"{name:<18} {result['seconds']:9.4f}s  {throughput:<32} {peak}")
+
+    if args.json:
+        report = {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "corpus": dict(corpus_options, mix=list(corpus_options["mix"]), files=info["files"],
+                           bytes=info["bytes"]),
+            "results": results,
+        }
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"结果已写入 {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+合成日记库生成器：按 YYYY/YYYYMM/YYYYMMDD.md 生成指定年数的日记，
+可调节篇幅、中文/英文/链接/图片的比例以及是否带模板开头，相同参数和种子生成的内容完全一致
+
+用法：python benchmarks/corpus.py <输出目录> [--years 3] [--min-chars 200] [--max-chars 1500] [--mix 80 10 5 5]
+"""
+import os
+import random
+import argparse
+from datetime import date, timedelta
+
+ZH_SENTENCES = [
+    "今天天气很好，我们一起去公园散步。", "晚上和朋友吃了火锅，心情不错。", "上午开会讨论了下个季度的工作计划。",
+    "读完了一本关于历史的书，收获很多。", "最近睡得有点晚，明天开始要早点休息。", "周末打算去图书馆学习一整天。",
+    "下午跑步五公里，感觉身体状态在慢慢恢复。", "和家人视频聊天，听说老家下了第一场雪。", "整理房间时找到了几张旧照片。",
+    "项目终于上线了，团队的努力没有白费。", "学习了新的做饭技巧，番茄炒蛋比以前好吃。", "看了一部电影，结局出乎意料。",
+]
+EN_SENTENCES = [
+    "Worked on some Python code today.", "Reviewed a pull request about caching.", "The meeting ran long again.",
+    "Read a chapter of a novel before bed.", "Went for a run in the morning.", "Fixed a tricky bug in the parser.",
+]
+URLS = ["https://example.com/blog/post", "https://docs.python.org/3/library/re.html", "http://news.example.org/a?b=1"]
+IMAGES = ["![photo](https://img.example.com/p{n}.jpg)", "![](assets/{n}.png)", "<img src=\"pic{n}.jpg\"/>"]
+
+BOILERPLATE = """# {day:%Y%m%d}
+
+## 今日计划
+- 今天我完成了哪些事情？
+
+## 饮食记录
+- 今天吃了什么美食？
+
+## 心情与思绪
+- 今天有什么特别的感受或想法？
+
+"""
+
+# 默认比例（中文句子、英文句子、链接、图片）
+DEFAULT_MIX = (80, 10, 5, 5)
+
+
+def _make_piece(rng, kind):
+    if kind == 0:
+        return rng.choice(ZH_SENTENCES)
+    if kind == 1:
+        return " " + rng.choice(EN_SENTENCES) + " "
+    if kind == 2:
+        url = rng.choice(URLS)
+        return f"[参考链接]({url}) " if rng.random() < 0.5 else f" {url} "
+    return rng.choice(IMAGES).format(n=rng.randint(1, 999)) + "\n"
+
+
+def make_entry(rng, day, min_chars=200, max_chars=1500, mix=DEFAULT_MIX, boilerplate=True):
+    """生成一篇日记的内容，正文长度（字符数）在 [min_chars, max_chars] 之间随机"""
+    target = rng.randint(min_chars, max_chars)
+    pieces = [BOILERPLATE.format(day=day)] if boilerplate else []
+    length = 0
+    kinds = range(len(mix))
+    while length < target:
+        piece = _make_piece(rng, rng.choices(kinds, weights=mix)[0])
+        if rng.random() < 0.1:
+            piece += "\n\n"
+        pieces.append(piece)
+        length += len(piece)
+    return "".join(pieces)
+
+
+def generate_corpus(root_path, years=3, start_year=2020, min_chars=200, max_chars=1500, mix=DEFAULT_MIX,
+                    boilerplate=True, density=1.0, seed=42):
+    """
+    在 root_path 下生成日记库，density 为每天有日记的概率
+    返回 {'files': 文件数, 'bytes': 总字节数, 'start': 首日, 'end': 末日}
+    """
+    rng = random.Random(seed)
+    start = date(start_year, 1, 1)
+    end = date(start_year + years - 1, 12, 31)
+    files = total_bytes = 0
+    month_dir = None
+    day = start
+    while day <= end:
+        if rng.random() < density:
+            dir_path = os.path.join(root_path, day.strftime("%Y"), day.strftime("%Y%m"))
+            if dir_path != month_dir:
+                month_dir = dir_path
+                os.makedirs(month_dir, exist_ok=True)
+            data = make_entry(rng, day, min_chars, max_chars, mix, boilerplate).encode("utf-8")
+            with open(os.path.join(month_dir, day.strftime("%Y%m%d.md")), "wb") as f:
+                f.write(data)
+            files += 1
+            total_bytes += len(data)
+        day += timedelta(days=1)
+    return {"files": files, "bytes": total_bytes, "start": start, "end": end}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="生成合成日记库")
+    parser.add_argument("root_path")
+    parser.add_argument("--years", type=int, default=3)
+    parser.add_argument("--start-year", type=int, default=2020)
+    parser.add_argument("--min-chars", type=int, default=200)
+    parser.add_argument("--max-chars", type=int, default=1500)
+    parser.add_argument("--mix", type=int, nargs=4, default=list(DEFAULT_MIX), metavar=("ZH", "EN", "URL", "IMG"),
+                        help="中文句子、英文句子、链接、图片的比例")
+    parser.add_argument("--no-boilerplate", action="store_true", help="不带模板开头")
+    parser.add_argument("--density", type=float, default=1.0, help="每天有日记的概率")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    info = generate_corpus(args.root_path, args.years, args.start_year, args.min_chars, args.max_chars,
+                           tuple(args.mix), not args.no_boilerplate, args.density, args.seed)
+    print(f"已生成 {info['files']} 篇日记（{info['bytes'] / 1024 / 1024:.1f} MB）: {args.root_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+import os
+import json
+import sqlite3
+import threading
+from collections import Counter
+
+# 缓存统一存放在日记根目录下的隐藏目录中，随日记一起迁移
+CACHE_DIR_NAME = ".diary_cache"
+CACHE_DB_NAME = "analysis.sqlite3"
+
+
+def get_cache_dir(root_path):
+    return os.path.join(root_path, CACHE_DIR_NAME)
+
+
+def open_cache_db(root_path):
+    """
+    打开（必要时创建）日记根目录下的缓存数据库
+    连接允许跨线程使用，调用方需自行加锁
+    根目录不存在时抛出 FileNotFoundError，不会顺带创建根目录
+    """
+    if not os.path.isdir(root_path):
+        raise FileNotFoundError(f"日记根目录不存在：{root_path}")
+    cache_dir = get_cache_dir(root_path)
+    os.makedirs(cache_dir, exist_ok=True)
+    conn = sqlite3.connect(os.path.join(cache_dir, CACHE_DB_NAME), timeout=30, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+class AnalysisCache:
+    """
+    单文件分析结果缓存
+    以 相对路径 + mtime + size + 分析版本（停用词/分词规则）为键，
+    保存清洗后的字数与词频 Counter，进程重启后依然有效
+    """
+
+    def __init__(self, root_path, version):
+        self.root_path = root_path
+        self.version = version
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._pending = []
+        self._conn = open_cache_db(root_path)
+        with self._lock:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS file_analysis (
+                    rel_path   TEXT PRIMARY KEY,
+                    mtime_ns   INTEGER NOT NULL,
+                    size       INTEGER NOT NULL,
+                    version    TEXT NOT NULL,
+                    char_count INTEGER NOT NULL,
+                    tokens     TEXT NOT NULL,
+                    token_total INTEGER
+                )
+            """)
+            # 早期版本的缓存表没有 token_total 列
+            columns = [row[1] for row in self._conn.execute("PRAGMA table_info(file_analysis)")]
+            if 'token_total' not in columns:
+                self._conn.execute("ALTER TABLE file_analysis ADD COLUMN token_total INTEGER")
+            self._conn.commit()
+
+    def get(self, rel_path, mtime_ns, size, with_tokens=True):
+        """
+        命中返回 (字数, Counter, 词语总数)，文件有变化或版本不符返回 None
+        with_tokens=False 时不解码词频，Counter 位置返回 None
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT mtime_ns, size, version, char_count, tokens, token_total FROM file_analysis "
+                "WHERE rel_path = ?",
+                (rel_path,)
+            ).fetchone()
+        if row is None or row[0] != mtime_ns or row[1] != size or row[2] != self.version:
+            self.misses += 1
+            return None
+        self.hits += 1
+        counter = None
+        token_total = row[5]
+        if with_tokens or token_total is None:
+            counter = Counter(json.loads(row[4]))
+            token_total = sum(counter.values())
+        return row[3], counter, token_total
+
+    def put(self, rel_path, mtime_ns, size, char_count, counter):
+        """暂存一条分析结果，调用 flush() 后统一写入"""
+        self._pending.append((rel_path, mtime_ns, size, self.version, char_count,
+                              json.dumps(counter, ensure_ascii=False), sum(counter.values())))
+
+    def flush(self):
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, []
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO file_analysis "
+                "(rel_path, mtime_ns, size, version, char_count, tokens, token_total) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                pending
+            )
+            self._conn.commit()
+
+    def close(self):
+        self.flush()
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,109 @@
+"""
+区间词频对比
+两个区间的完整词频向量在同一词语下标上对齐（优先直接使用增量词频存储的词 id），
+绝对变化、相对变化、对数几率等指标全部用 NumPy 向量化计算，再用 argpartition 取前 k 个
+"""
+import numpy as np
+import pandas as pd
+
+from diary_stats import collect_diary_data_multi
+
+COMPARE_COLUMNS = ['词汇', '区间1频率', '区间2频率', '变化', '相对变化', '对数几率']
+
+# 对数几率使用的先验强度（informative Dirichlet prior），先验按两个区间合计的词频分布
+PRIOR_STRENGTH = 1000.0
+
+
+def align_counters(*counters):
+    """把若干 Counter 对齐到共同的词语下标，返回 (terms, [向量, ...])"""
+    index = {}
+    for counter in counters:
+        for term in counter:
+            index.setdefault(term, len(index))
+    vectors = []
+    for counter in counters:
+        vector = np.zeros(len(index), dtype=np.int64)
+        ids = np.fromiter((index[term] for term in counter), dtype=np.int64, count=len(counter))
+        vector[ids] = np.fromiter(counter.values(), dtype=np.int64, count=len(counter))
+        vectors.append(vector)
+    return list(index), vectors
+
+
+def compare_vectors(terms, v1, v2, k=100, sort_by='对数几率', min_count=1):
+    """
+    比较两个对齐的词频向量
+    - 变化：区间2次数 - 区间1次数
+    - 相对变化：平滑后的词频占比之比 - 1（区间1未出现的词也是有限值）
+    - 对数几率：带先验的对数几率差的 z 分数，兼顾变化幅度和样本量，适合挑出各区间的“特色词”
+    只保留两区间合计不少于 min_count 次的词，按 sort_by 的绝对值取前 k 个（k 为 None 时全部保留），
+    结果按 sort_by 从高到低排列
+    """
+    if sort_by not in COMPARE_COLUMNS[3:]:
+        raise ValueError(f"不支持的排序指标: {sort_by}")
+    size = max(len(v1), len(v2), len(terms))
+    v1 = np.pad(np.asarray(v1, dtype=np.int64), (0, size - len(v1)))
+    v2 = np.pad(np.asarray(v2, dtype=np.int64), (0, size - len(v2)))
+    candidates = np.flatnonzero(v1 + v2 >= max(min_count, 1))
+    if not len(candidates):
+        return pd.DataFrame(columns=COMPARE_COLUMNS)
+
+    c1 = v1[candidates].astype(np.float64)
+    c2 = v2[candidates].astype(np.float64)
+    n1, n2 = v1.sum(), v2.sum()
+    vocab = len(candidates)
+
+    relative = ((c2 + 1) / (n2 + vocab)) / ((c1 + 1) / (n1 + vocab)) - 1
+
+    prior = PRIOR_STRENGTH * (c1 + c2) / (n1 + n2)
+    delta = (np.log((c2 + prior) / (n2 + PRIOR_STRENGTH - c2 - prior))
+             - np.log((c1 + prior) / (n1 + PRIOR_STRENGTH - c1 - prior)))
+    z_scores = delta / np.sqrt(1 / (c1 + prior) + 1 / (c2 + prior))
+
+    metrics = {'变化': c2 - c1, '相对变化': relative, '对数几率': z_scores}
+    metric = metrics[sort_by]
+    if k is not None and k < len(candidates):
+        picked = np.argpartition(-np.abs(metric), k - 1)[:k]
+    else:
+        picked = np.arange(len(candidates))
+    picked = picked[np.argsort(-metric[picked], kind='stable')]
+
+    return pd.DataFrame({
+        '词汇': [terms[i] for i in candidates[picked]],
+        '区间1频率': v1[candidates[picked]],
+        '区间2频率': v2[candidates[picked]],
+        '变化': (c2 - c1)[picked].astype(np.int64),
+        '相对变化': np.round(relative[picked], 4),
+        '对数几率': np.round(z_scores[picked], 3),
+    })
+
+
+def compare_counters(counter_1, counter_2, k=100, sort_by='对数几率', min_count=1):
+    terms, (v1, v2) = align_counters(counter_1, counter_2)
+    return compare_vectors(terms, v1, v2, k, sort_by, min_count)
+
+
+def result_vectors(results):
+    """
+    由 collect_diary_data_multi(..., word_vectors=True) 的结果得到 (terms, [各区间的完整词频向量])
+    有词频存储时直接使用其词 id 下标的向量，否则对齐各区间的 Counter
+    """
+    if all("word_vector" in result for result in results):
+        return results[0]["word_terms"], [result["word_vector"] for result in results]
+    return align_counters(*(result["word_counter"] for result in results))
+
+
+def range_vectors(root_path, date_ranges, stopwords_path=None):
+    """返回 (terms, [各区间的完整词频向量])，先同步有变化的日期（各区间一次遍历完成）"""
+    return result_vectors(collect_diary_data_multi(root_path, date_ranges, stopwords_path, word_vectors=True))
+
+
+def compare_results(result_1, result_2, k=100, sort_by='对数几率', min_count=1):
+    """对比两个已收集的区间结果（collect_diary_data_multi 传入 word_vectors=True），不再重新同步"""
+    terms, (v1, v2) = result_vectors([result_1, result_2])
+    return compare_vectors(terms, v1, v2, k, sort_by, min_count)
+
+
+def compare_ranges(root_path, range_1, range_2, stopwords_path=None, k=100, sort_by='对数几率', min_count=1):
+    """对比两个日期区间的完整词频（不受 Top 100 截断影响），返回 compare_vectors 的结果"""
+    terms, (v1, v2) = range_vectors(root_path, [range_1, range_2], stopwords_path)
+    return compare_vectors(terms, v1, v2, k, sort_by, min_count)
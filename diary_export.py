@@ -0,0 +1,346 @@
+"""
+分析结果的列式导出（Parquet / Feather）
+把逐篇日记表、日汇总表和每天的词频写成按年分区的列式文件，
+之后可以直接加载，不必重新读取、分词；其他工具（DuckDB、Polars、pandas 等）也能直接查询
+
+目录结构（hive 分区，year=YYYY）：
+    <导出目录>/manifest.json
+    <导出目录>/entries/year=2024/part.feather    逐篇日记
+    <导出目录>/rollup/year=2024/part.feather     日汇总
+    <导出目录>/tokens/year=2024/part.feather     每天的词频（词语 id + 次数）
+    <导出目录>/terms.feather                     词语 id -> 词语
+
+只重新写入内容有变化的年份；词语 id 来自增量词频存储（.diary_cache），清单中记录词表指纹，
+词表不再是上次导出词表的延续（例如删除了缓存）时全部重写。需要安装 pyarrow（pip install pyarrow）
+
+用法：python diary_export.py <日记根目录> [导出目录] [--format feather|parquet] [--stopwords stopwords.txt]
+      python diary_export.py --load <导出目录> [--years 2023 2024]
+"""
+import os
+import json
+import time
+import hashlib
+import shutil
+import argparse
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+from diary_index import get_diary_index
+from diary_stats import analysis_version, collect_diary_data, open_word_store, analyze_items
+from diary_stopwords import get_stopword_service
+
+EXPORT_VERSION = "1"
+EXPORT_DIRNAME = "diary_dataset"
+FORMATS = {'feather': 'part.feather', 'parquet': 'part.parquet'}
+TABLES = ('entries', 'rollup', 'tokens')
+MANIFEST = "manifest.json"
+
+
+def _require_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.feather
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError("列式导出需要安装 pyarrow：pip install pyarrow") from None
+    return pyarrow
+
+
+def default_export_dir(root_path):
+    return os.path.join(root_path, EXPORT_DIRNAME)
+
+
+def _year_ranges(index):
+    years = sorted({f.date.year for f in index.query(restat=False)})
+    return {year: (date(year, 1, 1), date(year, 12, 31)) for year in years}
+
+
+def _read_manifest(export_dir):
+    try:
+        with open(os.path.join(export_dir, MANIFEST), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _terms_digest(terms):
+    digest = hashlib.sha1()
+    for term in terms:
+        digest.update(term.encode('utf-8') + b'\n')
+    return digest.hexdigest()
+
+
+def _terms_compatible(old_terms, terms):
+    """词语 id 只追加不重排：上次导出的词表是当前词表的前缀时，已有分区的 id 仍然有效"""
+    if not isinstance(old_terms, dict):
+        return False
+    size = old_terms.get('count')
+    if not isinstance(size, int) or size > len(terms):
+        return False
+    return _terms_digest(terms[:size]) == old_terms.get('digest')
+
+
+def _write_table(pa, table, path, fmt):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    if fmt == 'feather':
+        # 不压缩：加载时按 Arrow 格式整块读入，无需解压和解码
+        pa.feather.write_feather(table, tmp_path, compression='uncompressed')
+    else:
+        pa.parquet.write_table(table, tmp_path, compression='zstd')
+    os.replace(tmp_path, path)
+
+
+def _entries_table(pa, records):
+    dates = np.array([r[0].date for r in records], dtype='datetime64[D]')
+    return pa.table({
+        'date': pa.array(dates, type=pa.date32()),
+        'month': pa.array([r[0].date.month for r in records], type=pa.int8()),
+        'day': pa.array([r[0].date.day for r in records], type=pa.int8()),
+        'file': pa.array([os.path.basename(r[0].rel_path) for r in records], type=pa.string()),
+        'rel_path': pa.array([r[0].rel_path for r in records], type=pa.string()),
+        'chars': pa.array([r[1] for r in records], type=pa.int32()),
+        'tokens': pa.array([r[3] for r in records], type=pa.int32()),
+        'size': pa.array([r[0].size for r in records], type=pa.int64()),
+        'mtime_ns': pa.array([r[0].mtime_ns for r in records], type=pa.int64()),
+    })
+
+
+def _rollup_table(pa, records):
+    frame = pd.DataFrame({
+        'date': np.array([r[0].date for r in records], dtype='datetime64[D]'),
+        'chars': np.array([r[1] for r in records], dtype=np.int64),
+        'files': np.ones(len(records), dtype=np.int64),
+        'tokens': np.array([r[3] for r in records], dtype=np.int64),
+    }).groupby('date', sort=True).sum()
+    return pa.table({
+        'date': pa.array(frame.index.to_numpy().astype('datetime64[D]'), type=pa.date32()),
+        'chars': pa.array(frame['chars'].to_numpy(), type=pa.int32()),
+        'files': pa.array(frame['files'].to_numpy(), type=pa.int32()),
+        'tokens': pa.array(frame['tokens'].to_numpy(), type=pa.int32()),
+    })
+
+
+def _tokens_table(pa, day_rows):
+    epoch = date(1970, 1, 1).toordinal()
+    lengths = [len(ids) for _, ids, _ in day_rows]
+    empty = np.zeros(0, dtype=np.int64)
+    days = np.repeat(np.array([o - epoch for o, _, _ in day_rows], dtype=np.int32), lengths)
+    return pa.table({
+        'date': pa.array(days, type=pa.int32()).cast(pa.date32()),
+        'term_id': pa.array(np.concatenate([empty] + [ids for _, ids, _ in day_rows]).astype(np.int32)),
+        'count': pa.array(np.concatenate([empty] + [c for _, _, c in day_rows]).astype(np.int32)),
+    })
+
+
+def export_dataset(root_path, export_dir=None, stopwords_path=None, fmt='feather', force=False):
+    """
+    导出（或增量更新）列式数据集
+    按年比较索引指纹，只重写有变化的年份；格式、停用词、分词规则或词表 id 变化时全部重写
+    返回 {'written': [年份], 'removed': [年份], 'unchanged': [年份], 'seconds': 耗时}
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"不支持的导出格式: {fmt}")
+    pa = _require_pyarrow()
+    started = time.perf_counter()
+    export_dir = export_dir or default_export_dir(root_path)
+
+    # 先同步分析缓存和增量词频存储，后面的读取都是缓存命中
+    collect_diary_data(root_path, stopwords_path)
+    stopwords, stopwords_version = get_stopword_service(stopwords_path).snapshot()
+    version = analysis_version(stopwords_version)
+
+    index = get_diary_index(root_path)
+    year_ranges = _year_ranges(index)
+    fingerprints = {str(year): index.fingerprint(*bounds) for year, bounds in year_ranges.items()}
+
+    word_store = open_word_store(root_path, version)
+    try:
+        terms = list(word_store.terms) if word_store is not None else []
+        manifest = _read_manifest(export_dir)
+        rewrite_all = force or manifest.get('export_version') != EXPORT_VERSION \
+            or manifest.get('analysis_version') != version or manifest.get('format') != fmt \
+            or not _terms_compatible(manifest.get('terms'), terms)
+        if rewrite_all and os.path.isdir(export_dir):
+            for table in TABLES:
+                shutil.rmtree(os.path.join(export_dir, table), ignore_errors=True)
+        old_years = {} if rewrite_all else manifest.get('years', {})
+
+        changed = [year for year in year_ranges if old_years.get(str(year)) != fingerprints[str(year)]]
+        removed = sorted(int(year) for year in old_years if year not in fingerprints)
+
+        filename = FORMATS[fmt]
+        for year in changed:
+            start_date, end_date = year_ranges[year]
+            items = index.query(start_date, end_date)
+            # token_days 为空集：缓存命中时不解码逐文件词频，只取字数和词数
+            records = analyze_items(root_path, items, stopwords, version, token_days=set())
+            day_rows = word_store.day_rows(start_date, end_date) if word_store is not None else []
+            partition = f"year={year}"
+            _write_table(pa, _entries_table(pa, records), os.path.join(export_dir, 'entries', partition, filename), fmt)
+            _write_table(pa, _rollup_table(pa, records), os.path.join(export_dir, 'rollup', partition, filename), fmt)
+            _write_table(pa, _tokens_table(pa, day_rows), os.path.join(export_dir, 'tokens', partition, filename), fmt)
+        if word_store is not None:
+            # day_rows 可能读到同步后新增的词语，按最终词表写出
+            terms = list(word_store.terms)
+    finally:
+        if word_store is not None:
+            word_store.close()
+    terms_path = os.path.join(export_dir, 'terms.feather')
+    old_count = None if rewrite_all else manifest.get('terms', {}).get('count')
+    if old_count != len(terms) or not os.path.exists(terms_path):
+        _write_table(pa, pa.table({'term': pa.array(terms, type=pa.string())}), terms_path, 'feather')
+
+    for year in removed:
+        for table in TABLES:
+            shutil.rmtree(os.path.join(export_dir, table, f"year={year}"), ignore_errors=True)
+
+    manifest = {
+        'export_version': EXPORT_VERSION,
+        'analysis_version': version,
+        'format': fmt,
+        'years': fingerprints,
+        'terms': {'count': len(terms), 'digest': _terms_digest(terms)},
+    }
+    os.makedirs(export_dir, exist_ok=True)
+    tmp_path = os.path.join(export_dir, MANIFEST + ".tmp")
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, os.path.join(export_dir, MANIFEST))
+
+    return {
+        'written': sorted(changed),
+        'removed': removed,
+        'unchanged': sorted(year for year in year_ranges if year not in changed),
+        'seconds': time.perf_counter() - started,
+    }
+
+
+def _read_table(pa, path):
+    # 读入内存后立即关闭文件，不使用内存映射：映射的数据会被返回的 DataFrame 继续引用
+    # （例如 Arrow 存储的字符串列），Windows 上仍被映射的文件会使下一次导出替换或删除该分区失败
+    with pa.OSFile(path, 'rb') as source:
+        if path.endswith('.feather'):
+            return pa.ipc.open_file(source).read_all()
+        return pa.parquet.read_table(source)
+
+
+def _read_partitions(pa, export_dir, table, years):
+    base = os.path.join(export_dir, table)
+    tables = []
+    try:
+        partitions = sorted(os.listdir(base))
+    except OSError:
+        partitions = []
+    for partition in partitions:
+        if not partition.startswith('year='):
+            continue
+        year = int(partition[5:])
+        if years is not None and year not in years:
+            continue
+        for filename in FORMATS.values():
+            path = os.path.join(base, partition, filename)
+            if os.path.exists(path):
+                part = _read_table(pa, path)
+                tables.append(part.append_column('year', pa.array(np.full(part.num_rows, year, dtype=np.int16))))
+    if not tables:
+        return None
+    return pa.concat_tables(tables)
+
+
+def load_dataset(export_dir, years=None):
+    """
+    加载导出的数据集，返回 DataFrame 字典：
+    - entries：逐篇日记（date、year、month、day、file、rel_path、chars、tokens、size、mtime_ns）
+    - daily_rollup：与 collect_diary_data 的 daily_rollup 相同（日期索引，字数/文件数/词数）
+    - tokens：每天的词频（date、year、term、count），term 为 Categorical
+    years 为要加载的年份（默认全部）
+    """
+    pa = _require_pyarrow()
+    years = set(years) if years is not None else None
+
+    terms_path = os.path.join(export_dir, 'terms.feather')
+    terms = _read_table(pa, terms_path).column('term').to_pylist() if os.path.exists(terms_path) else []
+
+    entries = _read_partitions(pa, export_dir, 'entries', years)
+    entries = entries.to_pandas(date_as_object=False) if entries is not None else pd.DataFrame(
+        columns=['date', 'month', 'day', 'file', 'rel_path', 'chars', 'tokens', 'size', 'mtime_ns', 'year'])
+
+    rollup = _read_partitions(pa, export_dir, 'rollup', years)
+    if rollup is not None:
+        frame = rollup.to_pandas()
+        daily_rollup = pd.DataFrame({
+            '字数': frame['chars'].to_numpy(dtype=np.int64),
+            '文件数': frame['files'].to_numpy(dtype=np.int64),
+            '词数': frame['tokens'].to_numpy(dtype=np.int64),
+        }, index=pd.DatetimeIndex(pd.to_datetime(frame['date']), name='日期'))
+    else:
+        daily_rollup = pd.DataFrame(columns=['字数', '文件数', '词数'], dtype=np.int64,
+                                    index=pd.DatetimeIndex([], name='日期'))
+
+    tokens = _read_partitions(pa, export_dir, 'tokens', years)
+    if tokens is not None:
+        frame = tokens.to_pandas(date_as_object=False)
+        # 词语 id 即类别编码，直接构造 Categorical，不生成逐行的字符串
+        frame['term'] = pd.Categorical.from_codes(frame.pop('term_id').to_numpy(), categories=pd.Index(terms))
+        tokens = frame[['date', 'year', 'term', 'count']]
+    else:
+        tokens = pd.DataFrame({'date': [], 'year': [], 'term': pd.Categorical([], categories=terms), 'count': []})
+
+    return {'entries': entries, 'daily_rollup': daily_rollup.sort_index(), 'tokens': tokens}
+
+
+def manifest_mtime_ns(export_dir):
+    """清单的修改时间（每次导出都会重写），没有导出过时返回 None；用于判断已加载的数据集是否过期"""
+    try:
+        return os.stat(os.path.join(export_dir, MANIFEST)).st_mtime_ns
+    except OSError:
+        return None
+
+
+def dataset_summary(data, top_k=5):
+    """按年汇总 load_dataset 的结果：篇数、字数、词数和高频词"""
+    summary = data['entries'].groupby('year').agg(
+        篇数=('file', 'size'), 字数=('chars', 'sum'), 词数=('tokens', 'sum'))
+    tokens = data['tokens']
+    if len(tokens):
+        totals = tokens.groupby(['year', 'term'], observed=True)['count'].sum().reset_index()
+        top = totals.sort_values(['year', 'count'], ascending=[True, False]).groupby('year').head(top_k)
+        summary['高频词'] = top.groupby('year')['term'].agg(lambda terms: "、".join(map(str, terms)))
+    else:
+        summary['高频词'] = ""
+    summary.index.name = '年份'
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="导出/加载列式日记数据集")
+    parser.add_argument("root_path", nargs="?", help="日记根目录")
+    parser.add_argument("export_dir", nargs="?", help=f"导出目录，默认 <日记根目录>/{EXPORT_DIRNAME}")
+    parser.add_argument("--format", choices=sorted(FORMATS), default='feather')
+    parser.add_argument("--stopwords")
+    parser.add_argument("--force", action="store_true", help="忽略已有导出，全部重写")
+    parser.add_argument("--load", metavar="EXPORT_DIR", help="加载导出目录并输出概况")
+    parser.add_argument("--years", type=int, nargs="+")
+    args = parser.parse_args()
+
+    if args.load:
+        start = time.perf_counter()
+        data = load_dataset(args.load, args.years)
+        elapsed = time.perf_counter() - start
+        print(f"加载耗时 {elapsed * 1000:.1f} ms：{len(data['entries'])} 篇日记，"
+              f"{len(data['daily_rollup'])} 天，{len(data['tokens'])} 条词频")
+        print(dataset_summary(data).to_string())
+        return
+    if not args.root_path:
+        parser.error("需要日记根目录")
+
+    result = export_dataset(args.root_path, args.export_dir, args.stopwords, args.format, args.force)
+    print(f"导出完成（{result['seconds']:.2f}s）：写入 {result['written'] or '无'}，"
+          f"删除 {result['removed'] or '无'}，未变化 {result['unchanged'] or '无'}")
+
+
+if __name__ == "__main__":
+    main()
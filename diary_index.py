@@ -0,0 +1,264 @@
+import os
+import json
+import hashlib
+import sqlite3
+import threading
+from bisect import bisect_left, bisect_right
+from collections import namedtuple
+from datetime import date
+
+from diary_cache import open_cache_db
+
+# 索引中的一条记录：日期、相对根目录的路径（统一使用 /）、文件大小、修改时间
+DiaryFile = namedtuple('DiaryFile', ['date', 'rel_path', 'size', 'mtime_ns'])
+
+
+def _parse_year_dir(name):
+    try:
+        return int(name)
+    except ValueError:
+        return None
+
+
+def _parse_month_dir(name):
+    # 与 extract_date_from_path 一致：取目录名后两位作为月份
+    try:
+        month = int(name[-2:])
+    except ValueError:
+        return None
+    return month if 1 <= month <= 12 else None
+
+
+class DiaryIndex:
+    """
+    按 年/年月 目录分区的日记文件索引
+    - 每个分区（YYYY/YYYYMM 目录）记录其下各目录的 mtime，目录未变化时不重新列举
+    - 查询只访问与日期区间重叠的分区，再在按日期排序的数组上二分
+    - 索引写入根目录的缓存数据库，进程重启后增量更新
+    """
+
+    def __init__(self, root_path, persist=True):
+        self.root_path = root_path
+        self._lock = threading.RLock()
+        # 分区相对路径 -> {'year', 'month', 'dirs': {相对目录: mtime_ns}, 'files': [DiaryFile]}
+        self._partitions = {}
+        self._ordinals = []
+        self._files = []
+        self._dirty = True
+        self._conn = None
+        if persist:
+            try:
+                self._conn = open_cache_db(root_path)
+                self._init_db()
+                self._load()
+            except (OSError, sqlite3.Error):
+                self._conn = None
+
+    def _init_db(self):
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS index_partitions (
+                partition TEXT PRIMARY KEY,
+                year      INTEGER NOT NULL,
+                month     INTEGER NOT NULL,
+                dirs      TEXT NOT NULL
+            )
+        """)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS index_files (
+                rel_path  TEXT PRIMARY KEY,
+                partition TEXT NOT NULL,
+                date      INTEGER NOT NULL,
+                size      INTEGER NOT NULL,
+                mtime_ns  INTEGER NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS index_files_partition ON index_files(partition)")
+        self._conn.commit()
+
+    def _load(self):
+        for partition, year, month, dirs in self._conn.execute(
+                "SELECT partition, year, month, dirs FROM index_partitions"):
+            self._partitions[partition] = {'year': year, 'month': month, 'dirs': json.loads(dirs), 'files': []}
+        for rel_path, partition, ordinal, size, mtime_ns in self._conn.execute(
+                "SELECT rel_path, partition, date, size, mtime_ns FROM index_files"):
+            part = self._partitions.get(partition)
+            if part is not None:
+                part['files'].append(DiaryFile(date.fromordinal(ordinal), rel_path, size, mtime_ns))
+
+    def _save_partition(self, partition):
+        if self._conn is None:
+            return
+        part = self._partitions.get(partition)
+        self._conn.execute("DELETE FROM index_files WHERE partition = ?", (partition,))
+        if part is None:
+            self._conn.execute("DELETE FROM index_partitions WHERE partition = ?", (partition,))
+            return
+        self._conn.execute(
+            "INSERT OR REPLACE INTO index_partitions (partition, year, month, dirs) VALUES (?, ?, ?, ?)",
+            (partition, part['year'], part['month'], json.dumps(part['dirs']))
+        )
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO index_files (rel_path, partition, date, size, mtime_ns) VALUES (?, ?, ?, ?, ?)",
+            [(f.rel_path, partition, f.date.toordinal(), f.size, f.mtime_ns) for f in part['files']]
+        )
+
+    def _iter_partitions(self, start_date, end_date):
+        """列举与日期区间重叠的 (分区相对路径, 年, 月)，只访问相关的年份目录"""
+        first = (start_date.year, start_date.month) if start_date else None
+        last = (end_date.year, end_date.month) if end_date else None
+        try:
+            year_names = os.listdir(self.root_path)
+        except OSError:
+            return
+        for year_name in year_names:
+            year = _parse_year_dir(year_name)
+            if year is None:
+                continue
+            if (first and year < first[0]) or (last and year > last[0]):
+                continue
+            year_dir = os.path.join(self.root_path, year_name)
+            if not os.path.isdir(year_dir) or os.path.islink(year_dir):
+                continue
+            try:
+                month_names = os.listdir(year_dir)
+            except OSError:
+                continue
+            for month_name in month_names:
+                month = _parse_month_dir(month_name)
+                if month is None:
+                    continue
+                if (first and (year, month) < first) or (last and (year, month) > last):
+                    continue
+                month_dir = os.path.join(year_dir, month_name)
+                if os.path.isdir(month_dir) and not os.path.islink(month_dir):
+                    yield f"{year_name}/{month_name}", year, month
+
+    def _partition_changed(self, part):
+        for rel_dir, mtime_ns in part['dirs'].items():
+            try:
+                if os.stat(os.path.join(self.root_path, rel_dir)).st_mtime_ns != mtime_ns:
+                    return True
+            except OSError:
+                return True
+        return False
+
+    def _scan_partition(self, partition, year, month):
+        """重新列举一个分区（包含其中的子目录），日期规则与 extract_date_from_path 保持一致"""
+        dirs = {}
+        files = []
+        stack = [partition]
+        while stack:
+            rel_dir = stack.pop()
+            abs_dir = os.path.join(self.root_path, rel_dir)
+            try:
+                dirs[rel_dir] = os.stat(abs_dir).st_mtime_ns
+                with os.scandir(abs_dir) as it:
+                    for entry in it:
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append(f"{rel_dir}/{entry.name}")
+                            continue
+                        if not entry.name.endswith('.md'):
+                            continue
+                        try:
+                            file_date = date(year, month, int(entry.name[:8][6:8]))
+                            stat = entry.stat()
+                        except (ValueError, OSError):
+                            continue
+                        files.append(DiaryFile(file_date, f"{rel_dir}/{entry.name}", stat.st_size, stat.st_mtime_ns))
+            except OSError:
+                continue
+        return {'year': year, 'month': month, 'dirs': dirs, 'files': files}
+
+    def refresh(self, start_date=None, end_date=None):
+        """增量刷新与日期区间重叠的分区，返回重新列举的分区数"""
+        with self._lock:
+            changed = []
+            live = set()
+            for partition, year, month in self._iter_partitions(start_date, end_date):
+                live.add(partition)
+                part = self._partitions.get(partition)
+                if part is None or self._partition_changed(part):
+                    self._partitions[partition] = self._scan_partition(partition, year, month)
+                    changed.append(partition)
+
+            # 区间内已被删除的分区
+            first = (start_date.year, start_date.month) if start_date else None
+            last = (end_date.year, end_date.month) if end_date else None
+            for partition, part in list(self._partitions.items()):
+                key = (part['year'], part['month'])
+                if partition in live or (first and key < first) or (last and key > last):
+                    continue
+                del self._partitions[partition]
+                changed.append(partition)
+
+            if changed:
+                self._dirty = True
+                if self._conn is not None:
+                    try:
+                        for partition in changed:
+                            self._save_partition(partition)
+                        self._conn.commit()
+                    except sqlite3.Error:
+                        pass
+            return len(changed)
+
+    def _rebuild(self):
+        files = [f for part in self._partitions.values() for f in part['files']]
+        files.sort(key=lambda f: (f.date, f.rel_path))
+        self._files = files
+        self._ordinals = [f.date.toordinal() for f in files]
+        self._dirty = False
+
+    def query(self, start_date=None, end_date=None, restat=True):
+        """
+        返回日期区间内的日记文件列表（按日期排序）
+        restat=True 时重新读取返回文件的 size/mtime，保证内容修改也能被后续缓存识别
+        """
+        with self._lock:
+            self.refresh(start_date, end_date)
+            if self._dirty:
+                self._rebuild()
+            lo = bisect_left(self._ordinals, start_date.toordinal()) if start_date else 0
+            hi = bisect_right(self._ordinals, end_date.toordinal()) if end_date else len(self._files)
+            files = self._files[lo:hi]
+
+        if not restat:
+            return files
+        result = []
+        for f in files:
+            try:
+                stat = os.stat(os.path.join(self.root_path, f.rel_path))
+            except OSError:
+                continue
+            if stat.st_size != f.size or stat.st_mtime_ns != f.mtime_ns:
+                f = f._replace(size=stat.st_size, mtime_ns=stat.st_mtime_ns)
+            result.append(f)
+        return result
+
+    def fingerprint(self, start_date=None, end_date=None):
+        """区间内日记文件的指纹（路径、大小、mtime 的摘要），文件增删改都会使其变化"""
+        digest = hashlib.sha1()
+        for f in self.query(start_date, end_date):
+            digest.update(f"{f.rel_path}\0{f.size}\0{f.mtime_ns}\n".encode('utf-8'))
+        return digest.hexdigest()
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_diary_index(root_path):
+    """同一进程内按根目录复用索引对象，避免每次查询都从数据库重新加载"""
+    key = os.path.abspath(root_path)
+    with _indexes_lock:
+        index = _indexes.get(key)
+        if index is None:
+            index = DiaryIndex(root_path)
+            _indexes[key] = index
+        return index
@@ -1,9 +1,14 @@
 import os
-import sys
+import time
+import argparse
 import yaml
-import tkinter as tk
-from tkinter import filedialog, messagebox
-from utils.file_utils import create_diary_entry
+from datetime import datetime
+from utils.file_utils import create_diary_entry, create_diary_entries
+from utils.perf_utils import format_perf, last_runs, set_profiler
+from utils.startup_utils import lazy_import, record_timing, format_timings
+
+# tkinter 只在图形界面模式下导入，--nogui 命令行模式启动更快
+tk = None
 
 
 CONFIG_PATH = "config.yaml"
@@ -49,13 +54,13 @@ def save_config(config):
         yaml.dump(config, f, allow_unicode=True)
 
 def select_directory(entry_widget):
-    path = filedialog.askdirectory()
+    path = lazy_import('tkinter.filedialog').askdirectory()
     if path:
         entry_widget.delete(0, tk.END)
         entry_widget.insert(0, path)
 
 def select_file(entry_widget):
-    path = filedialog.askopenfilename(filetypes=[("Markdown files", "*.md"), ("All files", "*.*")])
+    path = lazy_import('tkinter.filedialog').askopenfilename(filetypes=[("Markdown files", "*.md"), ("All files", "*.*")])
     if path:
         entry_widget.delete(0, tk.END)
         entry_widget.insert(0, path)
@@ -68,10 +73,45 @@ def run_creation(config):
 
     if not base_path:
         return "根目录不能为空"
-    result = create_diary_entry(base_path, filename_format, use_template, template_path)
+    template_vars = config.get('template_vars') or {}
+    result = create_diary_entry(base_path, filename_format, use_template, template_path, template_vars)
     return result
 
+def run_bulk_creation(config, start_date, end_date):
+    base_path = config.get('base_path', '')
+    if not base_path:
+        return "根目录不能为空"
+    created, skipped = create_diary_entries(
+        base_path, start_date, end_date,
+        config.get('filename_format', '%Y%m%d.md'),
+        config.get('use_template', False),
+        config.get('template_path', ''),
+        config.get('template_vars') or {},
+    )
+    return f"✅ {start_date} ~ {end_date}：新建 {created} 篇，跳过已存在 {skipped} 篇"
+
+def parse_date_arg(value):
+    # argparse 的 type：无效日期给出用法错误，而不是 ValueError 堆栈
+    try:
+        return datetime.strptime(value, "%Y-%m-%d").date()
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"无效日期：{value}（格式为 YYYY-MM-DD）")
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="日记管理工具：默认打开图形界面")
+    parser.add_argument("--nogui", action="store_true", help="命令行模式：直接创建今日日记")
+    # --from/--to：批量补建区间内的日记，只给出其中一个时按单日处理
+    parser.add_argument("--from", dest="from_date", type=parse_date_arg, metavar="YYYY-MM-DD",
+                        help="批量补建的起始日期")
+    parser.add_argument("--to", dest="to_date", type=parse_date_arg, metavar="YYYY-MM-DD",
+                        help="批量补建的结束日期")
+    parser.add_argument("--timings", action="store_true", help="输出各阶段耗时")
+    return parser.parse_args(argv)
+
 def gui_main():
+    global tk
+    tk = lazy_import('tkinter')
+    messagebox = lazy_import('tkinter.messagebox')
     config = load_config()
 
     root = tk.Tk()
@@ -127,12 +167,14 @@ def gui_main():
         if not filename_format:
             filename_format = var_format.get()
 
-        new_config = {
+        # 在原配置上更新，保留 template_vars、stopwords_path 等界面上没有的字段
+        new_config = dict(config)
+        new_config.update({
             'base_path': entry_path.get(),
             'filename_format': filename_format,
             'use_template': var_template.get(),
             'template_path': entry_template.get(),
-        }
+        })
         save_config(new_config)
         res = run_creation(new_config)
         messagebox.showinfo("结果", res)
@@ -142,13 +184,28 @@ def gui_main():
 
     root.mainloop()
 
-def cli_main():
+def cli_main(args):
     config = load_config()
-    result = run_creation(config)
+    if config.get('profiler'):
+        set_profiler(config['profiler'])
+    from_date, to_date = args.from_date, args.to_date
+    start = time.perf_counter()
+    if from_date or to_date:
+        result = run_bulk_creation(config, from_date or to_date, to_date or from_date)
+    else:
+        result = run_creation(config)
+    record_timing("创建日记", time.perf_counter() - start)
     print(result)
+    if args.timings:
+        for line in format_timings():
+            print(line)
+        for run in last_runs():
+            for line in format_perf(run):
+                print(line)
 
 if __name__ == "__main__":
-    if '--nogui' in sys.argv:
-        cli_main()
+    args = parse_args()
+    if args.nogui:
+        cli_main(args)
     else:
         gui_main()
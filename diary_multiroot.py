@@ -0,0 +1,317 @@
+"""
+多根目录并发分析
+一个部署服务多个人的日记根目录时，在有上限的进程池中并发扫描所有根目录：
+- 每个根目录的文件按日期切成若干块（每块约 chunk_files 篇），各根目录的块轮流提交，
+  其他根目录还有块在等待时，同一根目录同时最多 per_root_limit 块在执行，大型日记库不会占满进程池、拖慢其他根目录；
+  只剩一个根目录（或其余根目录都已达到上限）时不再限制，空闲的进程继续处理剩下的块
+- 各根目录的缓存（.diary_cache 中的分析缓存、增量词频、日汇总）彼此独立，子进程把分析结果写入缓存，
+  某个根目录的块全部完成后，主进程直接从缓存汇总出该根目录的结果（完成一个就返回一个）
+- 可以按根目录分别返回，也可以合并为一份结果
+
+配置（config.yaml）：
+    roots:                 # 根目录列表，元素为路径或 {path, name, stopwords_path}
+      - D:/diary/alice
+      - {path: D:/diary/bob, name: bob}
+    root_workers: 4        # 进程池大小
+    root_limit: 1          # 其他根目录有块等待时，每个根目录同时执行的块数上限
+    root_chunk_files: 200  # 每块的日记篇数
+
+用法：python diary_multiroot.py [根目录 ...] [--workers 4] [--per-root 1] [--merge]
+     （不给出根目录时读取 config.yaml 的 roots）
+"""
+import os
+import time
+import argparse
+from collections import Counter, deque, namedtuple
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+import pandas as pd
+import yaml
+
+from diary_index import get_diary_index
+from diary_rollup import ROLLUP_COLUMNS
+from diary_stats import analysis_version, collect_diary_data, open_word_store, summarize_result, _to_date
+from diary_stopwords import get_stopword_service
+from diary_tokenizer import wait_for_jieba_init
+
+DEFAULT_WORKERS = 4
+DEFAULT_PER_ROOT_LIMIT = 1
+DEFAULT_CHUNK_FILES = 200
+
+# name 用于展示和合并结果中的“根目录”列
+DiaryRoot = namedtuple('DiaryRoot', ['path', 'name', 'stopwords_path'])
+# 单个根目录的结果：result 为 collect_diary_data 的返回值，失败时为 None 并记录 error
+RootResult = namedtuple('RootResult', ['root', 'result', 'error', 'seconds'])
+
+
+def load_roots(config):
+    """从配置读取根目录列表：优先 roots，未配置时退化为单个 base_path"""
+    entries = config.get('roots') or ([config['base_path']] if config.get('base_path') else [])
+    default_stopwords = config.get('stopwords_path') or None
+    roots = []
+    for entry in entries:
+        if isinstance(entry, dict):
+            path = entry.get('path')
+            name = entry.get('name')
+            stopwords_path = entry.get('stopwords_path') or default_stopwords
+        else:
+            path, name, stopwords_path = entry, None, default_stopwords
+        if path:
+            roots.append(DiaryRoot(path, name or os.path.basename(os.path.normpath(path)) or path, stopwords_path))
+    return roots
+
+
+def _as_root(root):
+    if isinstance(root, DiaryRoot):
+        return root
+    return DiaryRoot(root, os.path.basename(os.path.normpath(root)) or root, None)
+
+
+def plan_chunks(root_path, start_date=None, end_date=None, chunk_files=DEFAULT_CHUNK_FILES):
+    """
+    把根目录在区间内的日记按日期切块，返回 [(块起始日期, 块结束日期)]
+    块之间日期不重叠（同一天的文件总在同一块），只有一天的文件多于 chunk_files 时块才会超出
+    """
+    items = get_diary_index(root_path).query(start_date, end_date, restat=False)
+    chunks = []
+    first = last = None
+    size = 0
+    for item in items:
+        if first is not None and size >= chunk_files and item.date != last:
+            chunks.append((first, last))
+            first, size = None, 0
+        if first is None:
+            first = item.date
+        last = item.date
+        size += 1
+    if first is not None:
+        chunks.append((first, last))
+    return chunks
+
+
+def _analyze_chunk(root_path, stopwords_path, start_date, end_date):
+    """在子进程中分析一块：结果写入该根目录的缓存，只返回文件数"""
+    result = collect_diary_data(root_path, stopwords_path, start_date, end_date, workers=1)
+    return len(result["dataframe"])
+
+
+class _RoundRobin:
+    """按根目录轮流取出待执行的块，优先分给未达到并发上限的根目录"""
+
+    def __init__(self, plans, per_root_limit):
+        self.pending = {root: deque(chunks) for root, chunks in plans.items()}
+        self.running = dict.fromkeys(plans, 0)
+        self.order = deque(plans)
+        self.per_root_limit = max(1, per_root_limit)
+
+    def next_chunk(self):
+        # 上限只在有其他根目录可以使用这个进程时生效：待执行的根目录都已达到上限时，
+        # 仍按轮转顺序分出空闲的进程，而不是让进程池空等
+        task = self._take(lambda root: self.running[root] < self.per_root_limit)
+        if task is None:
+            task = self._take(lambda root: True)
+        return task
+
+    def _take(self, allowed):
+        for _ in range(len(self.order)):
+            root = self.order[0]
+            self.order.rotate(-1)
+            if self.pending[root] and allowed(root):
+                self.running[root] += 1
+                return root, self.pending[root].popleft()
+        return None
+
+    def finish(self, root):
+        self.running[root] -= 1
+
+    def done(self, root):
+        return not self.pending[root] and not self.running[root]
+
+
+def iter_collect_roots(roots, start_date=None, end_date=None, workers=DEFAULT_WORKERS,
+                       per_root_limit=DEFAULT_PER_ROOT_LIMIT, chunk_files=DEFAULT_CHUNK_FILES):
+    """
+    并发分析多个根目录，按完成顺序逐个产出 RootResult
+    workers<=1 或进程池不可用时在当前进程中按同样的轮转顺序串行执行
+    """
+    start_date, end_date = _to_date(start_date), _to_date(end_date)
+    roots = [_as_root(root) for root in roots]
+    started = {root: time.perf_counter() for root in roots}
+    errors = {}
+    plans = {}
+    for root in roots:
+        plans[root] = []
+        if not os.path.isdir(root.path):
+            errors[root] = FileNotFoundError(f"日记根目录不存在: {root.path}")
+            continue
+        try:
+            plans[root] = plan_chunks(root.path, start_date, end_date, chunk_files)
+        except OSError as e:
+            errors[root] = e
+    scheduler = _RoundRobin(plans, per_root_limit)
+
+    def finish_root(root):
+        error = errors.get(root)
+        result = None
+        if error is None:
+            try:
+                # 各块已写入缓存，这里全部命中，只做汇总
+                result = collect_diary_data(root.path, root.stopwords_path, start_date, end_date)
+            except Exception as e:
+                error = e
+        return RootResult(root, result, error, time.perf_counter() - started[root])
+
+    # 没有日记（或列举失败）的根目录直接返回
+    for root in roots:
+        if scheduler.done(root):
+            yield finish_root(root)
+
+    def run_serial():
+        while True:
+            task = scheduler.next_chunk()
+            if task is None:
+                return
+            root, (chunk_start, chunk_end) = task
+            try:
+                _analyze_chunk(root.path, root.stopwords_path, chunk_start, chunk_end)
+            except Exception as e:
+                errors.setdefault(root, e)
+            scheduler.finish(root)
+            if scheduler.done(root):
+                yield finish_root(root)
+
+    if workers is None or workers <= 1:
+        yield from run_serial()
+        return
+
+    wait_for_jieba_init()
+    try:
+        executor = ProcessPoolExecutor(max_workers=workers)
+    except OSError:
+        yield from run_serial()
+        return
+
+    with executor:
+        running = {}
+
+        def fill():
+            while len(running) < workers:
+                task = scheduler.next_chunk()
+                if task is None:
+                    return
+                root, (chunk_start, chunk_end) = task
+                try:
+                    future = executor.submit(_analyze_chunk, root.path, root.stopwords_path, chunk_start, chunk_end)
+                except (RuntimeError, BrokenProcessPool) as e:
+                    errors.setdefault(root, e)
+                    scheduler.finish(root)
+                    continue
+                running[future] = root
+
+        fill()
+        while running:
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            completed_roots = []
+            for future in finished:
+                root = running.pop(future)
+                try:
+                    future.result()
+                except Exception as e:
+                    errors.setdefault(root, e)
+                scheduler.finish(root)
+                if scheduler.done(root):
+                    completed_roots.append(root)
+            # 先补满进程池再汇总，汇总期间子进程不空闲
+            fill()
+            for root in completed_roots:
+                yield finish_root(root)
+
+
+def collect_roots(roots, start_date=None, end_date=None, workers=DEFAULT_WORKERS,
+                  per_root_limit=DEFAULT_PER_ROOT_LIMIT, chunk_files=DEFAULT_CHUNK_FILES):
+    """并发分析多个根目录，返回 {根目录名: RootResult}（按 roots 的顺序）"""
+    roots = [_as_root(root) for root in roots]
+    results = {r.root: r for r in iter_collect_roots(roots, start_date, end_date, workers, per_root_limit,
+                                                       chunk_files)}
+    return {root.name: results[root] for root in roots}
+
+
+def merge_results(root_results, start_date=None, end_date=None):
+    """
+    把各根目录的结果合并为一份，格式与 collect_diary_data 相同
+    - dataframe 增加“根目录”列
+    - 词频由各根目录的增量词频存储按完整 Counter 相加，不受各自 Top 100 截断影响
+    失败的根目录被跳过
+    """
+    start_date, end_date = _to_date(start_date), _to_date(end_date)
+    frames, rollups = [], []
+    word_counter = Counter()
+    for r in root_results:
+        if r.result is None:
+            continue
+        frame = r.result["dataframe"].copy()
+        frame.insert(0, '根目录', r.root.name)
+        frames.append(frame)
+        rollups.append(r.result["daily_rollup"])
+
+        _, stopwords_version = get_stopword_service(r.root.stopwords_path).snapshot()
+        word_store = open_word_store(r.root.path, analysis_version(stopwords_version))
+        if word_store is not None:
+            try:
+                word_counter.update(word_store.range_counter(start_date, end_date))
+            finally:
+                word_store.close()
+        else:
+            word_counter.update(dict(r.result["word_freq"]))
+
+    df = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+    rollups = [rollup for rollup in rollups if not rollup.empty]
+    if rollups:
+        rollup = pd.concat(rollups).groupby(level=0)[ROLLUP_COLUMNS].sum().sort_index()
+    else:
+        rollup = pd.DataFrame(columns=ROLLUP_COLUMNS, dtype='int64')
+    return summarize_result(df, rollup, word_counter)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="并发分析多个日记根目录")
+    parser.add_argument("roots", nargs="*", help="日记根目录，默认读取 config.yaml 的 roots")
+    parser.add_argument("--config", default="config.yaml")
+    parser.add_argument("--workers", type=int)
+    parser.add_argument("--per-root", type=int, help="其他根目录有块等待时，每个根目录同时执行的块数上限")
+    parser.add_argument("--chunk-files", type=int)
+    parser.add_argument("--merge", action="store_true", help="输出合并后的高频词")
+    args = parser.parse_args()
+
+    config = {}
+    if os.path.exists(args.config):
+        with open(args.config, 'r', encoding='utf-8') as f:
+            config = yaml.safe_load(f) or {}
+    roots = load_roots({'roots': args.roots, 'stopwords_path': config.get('stopwords_path')}) if args.roots \
+        else load_roots(config)
+    if not roots:
+        parser.error("没有可分析的根目录（命令行给出，或在 config.yaml 中配置 roots）")
+
+    workers = args.workers or config.get('root_workers') or DEFAULT_WORKERS
+    per_root_limit = args.per_root or config.get('root_limit') or DEFAULT_PER_ROOT_LIMIT
+    chunk_files = args.chunk_files or config.get('root_chunk_files') or DEFAULT_CHUNK_FILES
+
+    start = time.perf_counter()
+    results = []
+    for r in iter_collect_roots(roots, workers=workers, per_root_limit=per_root_limit, chunk_files=chunk_files):
+        results.append(r)
+        if r.error is not None:
+            print(f"[{r.seconds:7.2f}s] {r.root.name}: 失败 {r.error!r}")
+        else:
+            chars = int(r.result["daily_rollup"]['字数'].sum()) if not r.result["daily_rollup"].empty else 0
+            print(f"[{r.seconds:7.2f}s] {r.root.name}: {len(r.result['dataframe'])} 篇，{chars} 字")
+    print(f"共 {len(roots)} 个根目录，耗时 {time.perf_counter() - start:.2f}s")
+
+    if args.merge:
+        merged = merge_results(results)
+        print("合并高频词：" + "、".join(f"{word}({count})" for word, count in merged["word_freq"][:20]))
+
+
+if __name__ == "__main__":
+    main()
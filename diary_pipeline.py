@@ -0,0 +1,125 @@
+"""
+流式日记处理管道
+各阶段都是生成器，可自由组合：遍历 → 日期筛选 → 读取清洗 → 分词 → 汇总
+内存占用只与当前处理和预读的少量文件有关，遍历尚未结束就可以开始输出
+
+用法：python diary_pipeline.py <日记根目录> [--start 2024-01-01] [--end 2024-12-31]
+"""
+import os
+import argparse
+from collections import namedtuple, Counter
+from datetime import datetime
+
+from diary_index import DiaryFile
+from diary_reader import read_ahead
+from diary_stats import clean_markdown_text, extract_date_from_path, load_stopwords, build_result
+from diary_tokenizer import STATS_TOKENIZER
+
+# 管道中流动的轻量记录；tokens 为惰性迭代器，只能消费一次
+DiaryRecord = namedtuple('DiaryRecord', ['date', 'path', 'char_count', 'tokens'])
+
+
+def iter_diary_files(root_path, start_date=None, end_date=None):
+    """
+    惰性遍历根目录，产出 (date, 文件路径)
+    遍历时直接剪掉区间外的年份目录，不会进入无关的子树
+    """
+    for dirpath, dirnames, filenames in os.walk(root_path):
+        if os.path.normpath(dirpath) == os.path.normpath(root_path):
+            dirnames[:] = [d for d in dirnames if _year_in_range(d, start_date, end_date)]
+        for filename in filenames:
+            if not filename.endswith('.md'):
+                continue
+            date_obj = extract_date_from_path(dirpath, filename, root_path)
+            if date_obj:
+                yield date_obj, os.path.join(dirpath, filename)
+
+
+def _year_in_range(dirname, start_date, end_date):
+    try:
+        year = int(dirname)
+    except ValueError:
+        # 无法解析为年份的目录下不会有可识别日期的日记
+        return False
+    return (not start_date or year >= start_date.year) and (not end_date or year <= end_date.year)
+
+
+def filter_by_date(files, start_date=None, end_date=None):
+    for date_obj, path in files:
+        if start_date and date_obj < start_date:
+            continue
+        if end_date and date_obj > end_date:
+            continue
+        yield date_obj, path
+
+
+def read_and_clean(files):
+    """
+    读取并清洗 Markdown，产出 (date, 路径, 清洗后文本)，读取失败的文件被跳过
+    后续文件由读取线程预读（有上限），下游清洗、分词时磁盘 I/O 同时进行
+    """
+    for (date_obj, path), text, _ in read_ahead(files, key=lambda f: f[1]):
+        if text is None:
+            continue
+        yield date_obj, path, clean_markdown_text(text)
+
+
+def tokenize(docs, stopwords=frozenset(), tokenizer=STATS_TOKENIZER):
+    """分词阶段：产出 DiaryRecord，tokens 在被消费时才真正分词并过滤停用词"""
+    for date_obj, path, content in docs:
+        tokens = (w.strip() for w in tokenizer.tokenize(content) if w.strip() and w.strip() not in stopwords)
+        yield DiaryRecord(date_obj, path, len(content), tokens)
+
+
+def iter_diary_entries(root_path, stopwords_path=None, start_date=None, end_date=None):
+    """组合各阶段，按遍历顺序惰性产出 DiaryRecord"""
+    if isinstance(start_date, datetime):
+        start_date = start_date.date()
+    if isinstance(end_date, datetime):
+        end_date = end_date.date()
+    stopwords = load_stopwords(stopwords_path)
+    files = filter_by_date(iter_diary_files(root_path, start_date, end_date), start_date, end_date)
+    return tokenize(read_and_clean(files), stopwords)
+
+
+def reduce_diary_records(records, root_path=''):
+    """
+    汇总阶段：消费 DiaryRecord 流，得到与 collect_diary_data 相同格式的结果
+    词频只保留一个全局 Counter，不保存逐文件的分词结果
+    """
+    word_counter = Counter()
+    rows = []
+    for record in records:
+        token_total = 0
+        for token in record.tokens:
+            word_counter[token] += 1
+            token_total += 1
+        rel_path = os.path.relpath(record.path, root_path) if root_path else record.path
+        rows.append((DiaryFile(record.date, rel_path, 0, 0), record.char_count, None, token_total))
+    return build_result(rows, word_counter)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="流式统计日记字数与词频")
+    parser.add_argument("root_path")
+    parser.add_argument("--start", type=lambda s: datetime.strptime(s, "%Y-%m-%d").date())
+    parser.add_argument("--end", type=lambda s: datetime.strptime(s, "%Y-%m-%d").date())
+    parser.add_argument("--stopwords")
+    args = parser.parse_args()
+
+    def echo(records):
+        # 边处理边输出，不等遍历结束
+        for record in records:
+            print(f"{record.date}  {record.char_count:>6} 字  {record.path}")
+            yield record
+
+    result = reduce_diary_records(
+        echo(iter_diary_entries(args.root_path, args.stopwords, args.start, args.end)), args.root_path
+    )
+    print(f"共 {len(result['dataframe'])} 篇，总字数 {int(result['daily_rollup']['字数'].sum())}")
+    for word, count in result["word_freq"][:20]:
+        print(f"{word}\t{count}")
+
+
+if __name__ == "__main__":
+    main()
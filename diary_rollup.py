@@ -0,0 +1,130 @@
+import threading
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+from diary_cache import open_cache_db
+
+# 日汇总表的列：当日清洗后总字数、日记文件数、去停用词后的词语总数
+ROLLUP_COLUMNS = ['字数', '文件数', '词数']
+
+# 数据库中日期以序数（date.toordinal()）保存，与 datetime64[D] 之间差一个固定偏移
+_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+
+def build_daily_rollup(dates, char_counts, token_totals):
+    """
+    向量化构建日汇总表：每个日期一行，索引为 datetime64
+    dates / char_counts / token_totals 为逐文件的等长序列
+    """
+    frame = pd.DataFrame({
+        '日期': pd.to_datetime(pd.Series(list(dates), dtype=object)),
+        '字数': np.asarray(char_counts, dtype=np.int64),
+        '文件数': np.ones(len(char_counts), dtype=np.int64),
+        '词数': np.asarray(token_totals, dtype=np.int64),
+    })
+    return frame.groupby('日期')[ROLLUP_COLUMNS].sum().sort_index()
+
+
+def rollup_totals(rollup, freq, column='字数'):
+    """
+    由日汇总表派生合计，freq 为 'Y'/'M'/'D'
+    键格式与 collect_diary_data 一致：年为整数，月为 "YYYY-MM"，日为 "YYYY-MM-DD"
+    """
+    values = rollup[column]
+    if freq == 'Y':
+        grouped = values.groupby(rollup.index.year).sum()
+        keys = grouped.index
+    elif freq == 'M':
+        grouped = values.groupby(rollup.index.to_period('M')).sum()
+        keys = grouped.index.strftime('%Y-%m')
+    elif freq == 'D':
+        grouped = values
+        keys = rollup.index.strftime('%Y-%m-%d')
+    else:
+        raise ValueError(f"不支持的汇总粒度: {freq}")
+    return dict(zip(keys.tolist(), grouped.to_numpy().tolist()))
+
+
+class DailyRollupStore:
+    """
+    持久化的日汇总表，存放在根目录的缓存数据库中
+    按分析版本（停用词/分词规则）区分，同步时只写入有变化的日期
+    """
+
+    def __init__(self, root_path, version):
+        self.root_path = root_path
+        self.version = version
+        self._lock = threading.Lock()
+        self._conn = open_cache_db(root_path)
+        with self._lock:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS daily_rollup (
+                    date        INTEGER PRIMARY KEY,
+                    version     TEXT NOT NULL,
+                    char_count  INTEGER NOT NULL,
+                    file_count  INTEGER NOT NULL,
+                    token_total INTEGER NOT NULL
+                )
+            """)
+            self._conn.commit()
+
+    @staticmethod
+    def _ordinal_range(start_date, end_date):
+        lo = start_date.toordinal() if start_date else 0
+        hi = end_date.toordinal() if end_date else 10 ** 9
+        return lo, hi
+
+    def load(self, start_date=None, end_date=None):
+        """读取日期区间内的日汇总表（DataFrame，索引为 datetime64）"""
+        lo, hi = self._ordinal_range(start_date, end_date)
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT date, char_count, file_count, token_total FROM daily_rollup "
+                "WHERE date BETWEEN ? AND ? AND version = ? ORDER BY date",
+                (lo, hi, self.version)
+            ).fetchall()
+        data = np.array(rows, dtype=np.int64).reshape(-1, 4)
+        index = pd.DatetimeIndex((data[:, 0] - _EPOCH_ORDINAL).astype('datetime64[D]'), name='日期')
+        return pd.DataFrame(data[:, 1:], index=index, columns=ROLLUP_COLUMNS)
+
+    def update_days(self, rollup):
+        """写入（覆盖）若干日期的汇总行，适用于单日文件变化后的增量更新"""
+        if rollup.empty:
+            return
+        ordinals = rollup.index.values.astype('datetime64[D]').astype(np.int64) + _EPOCH_ORDINAL
+        values = rollup[ROLLUP_COLUMNS].to_numpy(dtype=np.int64)
+        rows = [(int(o), self.version, int(c), int(f), int(t)) for o, (c, f, t) in zip(ordinals, values)]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO daily_rollup (date, version, char_count, file_count, token_total) "
+                "VALUES (?, ?, ?, ?, ?)",
+                rows
+            )
+            self._conn.commit()
+
+    def remove_days(self, days):
+        if not len(days):
+            return
+        with self._lock:
+            self._conn.executemany("DELETE FROM daily_rollup WHERE date = ?", [(d.toordinal(),) for d in days])
+            self._conn.commit()
+
+    def sync(self, rollup, start_date=None, end_date=None):
+        """
+        用新计算的日汇总表同步区间内的存储：只写入新增或数值变化的日期，删除已不存在的日期
+        返回 (写入天数, 删除天数)
+        """
+        stored = self.load(start_date, end_date)
+        aligned = stored.reindex(rollup.index)
+        # 新增日期在 reindex 后为 NaN，与任何值比较都不相等，因此同样会被写入
+        changed = rollup[(aligned.to_numpy() != rollup[ROLLUP_COLUMNS].to_numpy()).any(axis=1)]
+        removed = stored.index.difference(rollup.index)
+        self.update_days(changed)
+        self.remove_days([ts.date() for ts in removed])
+        return len(changed), len(removed)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
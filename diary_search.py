@@ -0,0 +1,353 @@
+"""
+日记全文检索
+倒排索引保存在根目录的缓存数据库中：词语 -> 出现过的日记（次数、词语位置）
+每次检索前只重新索引区间内有变化的文件，之后的查询只读取查询词的倒排列表
+
+查询语法：
+- 空格分隔的多个词：同时包含（AND）
+- OR 或 |：任一组满足即可，例如 `跑步 OR 游泳`
+- 双引号："今天 天气" 按顺序相邻出现（短语）；一个词被切分成多个词语时也按短语匹配
+
+用法：python diary_search.py <日记根目录> <查询> [--start 2024-01-01] [--end 2024-12-31] [--limit 20]
+"""
+import os
+import re
+import math
+import sqlite3
+import argparse
+import threading
+from collections import namedtuple
+from datetime import date, datetime
+
+import numpy as np
+
+from diary_cache import open_cache_db
+from diary_index import get_diary_index
+from diary_reader import load_text, read_ahead
+from diary_stats import clean_markdown_text, _to_date
+from diary_tokenizer import cut_sequence
+
+# 切词规则或索引格式变化时递增，旧版本的文档会被重新索引
+SEARCH_INDEX_VERSION = "1"
+
+# 词语位置以小端 int32 数组保存
+_DTYPE = '<i4'
+
+# BM25 参数
+_K1 = 1.2
+_B = 0.75
+
+_QUERY_TOKEN_RE = re.compile(r'"([^"]*)"|(\S+)')
+
+SearchHit = namedtuple('SearchHit', ['date', 'rel_path', 'score', 'matches'])
+
+
+def parse_query(query):
+    """
+    把查询解析为 OR 分组，每组是若干必须同时满足的子句，子句为按顺序的词语元组
+    例如 `跑步 "早上 七点" OR 游泳` -> [[('跑步',), ('早上', '七点')], [('游泳',)]]
+    """
+    groups = [[]]
+    for match in _QUERY_TOKEN_RE.finditer(query):
+        phrase, word = match.groups()
+        text = phrase if phrase is not None else word
+        if phrase is None:
+            # 支持 a|b 这样不带空格的写法
+            pieces = re.split(r'(\|)', text)
+        else:
+            pieces = [text]
+        for piece in pieces:
+            if phrase is None and piece in ('OR', '|'):
+                if groups[-1]:
+                    groups.append([])
+                continue
+            tokens = tuple(cut_sequence(piece))
+            if tokens and tokens not in groups[-1]:
+                groups[-1].append(tokens)
+    return [group for group in groups if group]
+
+
+def _phrase_count(position_arrays):
+    """相邻出现的次数：第 i 个词的位置减去 i 后求交集"""
+    common = position_arrays[0]
+    for offset, positions in enumerate(position_arrays[1:], start=1):
+        common = np.intersect1d(common, positions - offset, assume_unique=True)
+        if not len(common):
+            return 0
+    return len(common)
+
+
+class SearchIndex:
+    """
+    增量维护的倒排索引
+    - search_docs：每篇日记一行，记录 size/mtime 和词语总数，文件未变化时不重新索引
+    - search_postings：(词 id, 文档 id) -> 出现次数与位置数组
+    """
+
+    def __init__(self, root_path):
+        self.root_path = root_path
+        self._lock = threading.Lock()
+        self._conn = open_cache_db(root_path)
+        with self._lock:
+            self._conn.execute("CREATE TABLE IF NOT EXISTS search_terms (id INTEGER PRIMARY KEY, term TEXT UNIQUE NOT NULL)")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS search_docs (
+                    doc_id   INTEGER PRIMARY KEY,
+                    rel_path TEXT UNIQUE NOT NULL,
+                    date     INTEGER NOT NULL,
+                    size     INTEGER NOT NULL,
+                    mtime_ns INTEGER NOT NULL,
+                    length   INTEGER NOT NULL,
+                    version  TEXT NOT NULL
+                )
+            """)
+            self._conn.execute("CREATE INDEX IF NOT EXISTS search_docs_date ON search_docs(date)")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS search_postings (
+                    term_id   INTEGER NOT NULL,
+                    doc_id    INTEGER NOT NULL,
+                    count     INTEGER NOT NULL,
+                    positions BLOB NOT NULL,
+                    PRIMARY KEY (term_id, doc_id)
+                ) WITHOUT ROWID
+            """)
+            self._conn.execute("CREATE INDEX IF NOT EXISTS search_postings_doc ON search_postings(doc_id)")
+            self._conn.commit()
+        self._term_ids = {}
+        self._term_count = 0
+        with self._lock:
+            self._refresh_terms()
+
+    def _refresh_terms(self):
+        # 其他连接可能追加了新词，按 id 增量读取
+        for term_id, term in self._conn.execute(
+                "SELECT id, term FROM search_terms WHERE id >= ? ORDER BY id", (self._term_count,)):
+            self._term_ids[term] = term_id
+            self._term_count = max(self._term_count, term_id + 1)
+
+    def _term_id(self, term):
+        term_id = self._term_ids.get(term)
+        if term_id is None:
+            term_id = self._term_count
+            self._conn.execute("INSERT INTO search_terms (id, term) VALUES (?, ?)", (term_id, term))
+            self._term_ids[term] = term_id
+            self._term_count += 1
+        return term_id
+
+    @staticmethod
+    def _ordinal_range(start_date, end_date):
+        lo = start_date.toordinal() if start_date else 0
+        hi = end_date.toordinal() if end_date else 10 ** 9
+        return lo, hi
+
+    def sync(self, items, ranges):
+        """
+        让索引与文件列表一致：重新索引新增或变化的文件，删除区间内已不存在的文件
+        items 为 DiaryIndex.query 返回的 DiaryFile 列表，ranges 为 [(start_date, end_date)]
+        返回重新索引的文件数
+        """
+        stored = {}
+        with self._lock:
+            for start_date, end_date in ranges:
+                lo, hi = self._ordinal_range(start_date, end_date)
+                for doc_id, rel_path, size, mtime_ns, version in self._conn.execute(
+                        "SELECT doc_id, rel_path, size, mtime_ns, version FROM search_docs WHERE date BETWEEN ? AND ?",
+                        (lo, hi)):
+                    stored[rel_path] = (doc_id, size, mtime_ns, version)
+
+        live = {item.rel_path for item in items}
+        changed = [item for item in items
+                   if stored.get(item.rel_path, (None,))[1:] != (item.size, item.mtime_ns, SEARCH_INDEX_VERSION)]
+        removed = [stored[rel_path][0] for rel_path in stored if rel_path not in live]
+        if not changed and not removed:
+            return 0
+
+        # 读取、分词在事务外完成，写锁只持有写入的时间；读取失败的文件从索引中移除
+        # 与统计共用 diary_reader 的预读和解码，后续文件在后台线程中提前读取
+        docs = []
+        for item, text, _ in read_ahead(changed, key=lambda f: os.path.join(self.root_path, f.rel_path)):
+            if text is None:
+                if item.rel_path in stored:
+                    removed.append(stored[item.rel_path][0])
+                continue
+            docs.append((item, cut_sequence(clean_markdown_text(text))))
+
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._refresh_terms()
+                for doc_id in removed:
+                    self._conn.execute("DELETE FROM search_postings WHERE doc_id = ?", (doc_id,))
+                    self._conn.execute("DELETE FROM search_docs WHERE doc_id = ?", (doc_id,))
+                for item, tokens in docs:
+                    self._write_doc(item, tokens)
+                self._conn.commit()
+            except Exception:
+                self._conn.rollback()
+                # 回滚后新分配的词 id 作废，重新从数据库加载词典
+                self._term_ids = {}
+                self._term_count = 0
+                self._refresh_terms()
+                raise
+        return len(docs)
+
+    def _write_doc(self, item, tokens):
+        row = self._conn.execute("SELECT doc_id FROM search_docs WHERE rel_path = ?", (item.rel_path,)).fetchone()
+        if row is not None:
+            doc_id = row[0]
+            self._conn.execute("DELETE FROM search_postings WHERE doc_id = ?", (doc_id,))
+            self._conn.execute(
+                "UPDATE search_docs SET date = ?, size = ?, mtime_ns = ?, length = ?, version = ? WHERE doc_id = ?",
+                (item.date.toordinal(), item.size, item.mtime_ns, len(tokens), SEARCH_INDEX_VERSION, doc_id)
+            )
+        else:
+            doc_id = self._conn.execute(
+                "INSERT INTO search_docs (rel_path, date, size, mtime_ns, length, version) VALUES (?, ?, ?, ?, ?, ?)",
+                (item.rel_path, item.date.toordinal(), item.size, item.mtime_ns, len(tokens), SEARCH_INDEX_VERSION)
+            ).lastrowid
+
+        positions = {}
+        for position, token in enumerate(tokens):
+            positions.setdefault(token, []).append(position)
+        self._conn.executemany(
+            "INSERT INTO search_postings (term_id, doc_id, count, positions) VALUES (?, ?, ?, ?)",
+            [(self._term_id(token), doc_id, len(pos), np.asarray(pos, dtype=_DTYPE).tobytes())
+             for token, pos in positions.items()]
+        )
+
+    def search(self, query, start_date=None, end_date=None, limit=None):
+        """
+        在已索引的文档中检索（不检查文件变化，需要时先调用 sync 或使用模块级 search）
+        按 BM25 得分从高到低返回 SearchHit 列表，matches 为命中子句的出现次数合计
+        """
+        groups = parse_query(query)
+        if not groups:
+            return []
+        lo, hi = self._ordinal_range(start_date, end_date)
+        with self._lock:
+            self._refresh_terms()
+            docs = {doc_id: (ordinal, rel_path, length) for doc_id, ordinal, rel_path, length in self._conn.execute(
+                "SELECT doc_id, date, rel_path, length FROM search_docs WHERE date BETWEEN ? AND ?", (lo, hi))}
+            if not docs:
+                return []
+            postings = {}
+            for token in {t for group in groups for clause in group for t in clause}:
+                term_id = self._term_ids.get(token)
+                postings[token] = {} if term_id is None else {
+                    doc_id: (count, positions) for doc_id, count, positions in self._conn.execute(
+                        "SELECT doc_id, count, positions FROM search_postings WHERE term_id = ?", (term_id,))
+                    if doc_id in docs
+                }
+
+        total_docs = len(docs)
+        avg_length = sum(d[2] for d in docs.values()) / total_docs or 1
+
+        def clause_matches(clause):
+            # 子句在各文档中的出现次数
+            if len(clause) == 1:
+                return {doc_id: count for doc_id, (count, _) in postings[clause[0]].items()}
+            candidates = set.intersection(*(set(postings[t]) for t in clause))
+            matches = {}
+            for doc_id in candidates:
+                arrays = [np.frombuffer(postings[t][doc_id][1], dtype=_DTYPE).astype(np.int64) for t in clause]
+                count = _phrase_count(arrays)
+                if count:
+                    matches[doc_id] = count
+            return matches
+
+        scores = {}
+        hit_counts = {}
+        for group in groups:
+            group_scores = None
+            group_counts = {}
+            for clause in group:
+                matches = clause_matches(clause)
+                df = len(matches)
+                idf = math.log(1 + (total_docs - df + 0.5) / (df + 0.5))
+                clause_scores = {}
+                for doc_id, tf in matches.items():
+                    norm = _K1 * (1 - _B + _B * docs[doc_id][2] / avg_length)
+                    clause_scores[doc_id] = idf * tf * (_K1 + 1) / (tf + norm)
+                    group_counts[doc_id] = group_counts.get(doc_id, 0) + tf
+                if group_scores is None:
+                    group_scores = clause_scores
+                else:
+                    group_scores = {d: s + clause_scores[d] for d, s in group_scores.items() if d in clause_scores}
+                if not group_scores:
+                    break
+            for doc_id, score in (group_scores or {}).items():
+                if score > scores.get(doc_id, -1):
+                    scores[doc_id] = score
+                    hit_counts[doc_id] = group_counts[doc_id]
+
+        ranked = sorted(scores, key=lambda d: (-scores[d], -docs[d][0], docs[d][1]))
+        if limit is not None:
+            ranked = ranked[:limit]
+        return [SearchHit(date.fromordinal(docs[d][0]), docs[d][1], round(scores[d], 4), hit_counts[d])
+                for d in ranked]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def open_search_index(root_path):
+    """打开根目录下的倒排索引，不可用时返回 None"""
+    try:
+        return SearchIndex(root_path)
+    except (OSError, sqlite3.Error):
+        return None
+
+
+def search(root_path, query, start_date=None, end_date=None, limit=50):
+    """
+    全文检索日记，返回按相关度排序的 SearchHit 列表
+    检索前只重新索引区间内新增或修改过的文件，首次使用时会为区间内的全部日记建立索引
+    """
+    start_date, end_date = _to_date(start_date), _to_date(end_date)
+    search_index = open_search_index(root_path)
+    if search_index is None:
+        return []
+    try:
+        items = get_diary_index(root_path).query(start_date, end_date)
+        search_index.sync(items, [(start_date, end_date)])
+        return search_index.search(query, start_date, end_date, limit)
+    finally:
+        search_index.close()
+
+
+def make_snippet(root_path, hit, query, width=40):
+    """读取命中的日记，截取第一个查询词附近的一段文字作为摘要（与建立索引时相同的读取和解码方式）"""
+    text, _ = load_text(os.path.join(root_path, hit.rel_path))
+    if text is None:
+        return ""
+    text = clean_markdown_text(text)
+    lowered = text.lower()
+    # 中文词语之间原文没有空格，英文单词之间有
+    words = [(' ' if ''.join(clause).isascii() else '').join(clause)
+             for group in parse_query(query) for clause in group]
+    positions = [p for p in (lowered.find(w) for w in words) if p >= 0]
+    start = max(min(positions) - width // 2, 0) if positions else 0
+    snippet = text[start:start + width * 2].replace('\n', ' ').strip()
+    return ("…" if start > 0 else "") + snippet + ("…" if start + width * 2 < len(text) else "")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="全文检索日记")
+    parser.add_argument("root_path")
+    parser.add_argument("query")
+    parser.add_argument("--start", type=lambda s: datetime.strptime(s, "%Y-%m-%d").date())
+    parser.add_argument("--end", type=lambda s: datetime.strptime(s, "%Y-%m-%d").date())
+    parser.add_argument("--limit", type=int, default=20)
+    args = parser.parse_args()
+
+    hits = search(args.root_path, args.query, args.start, args.end, args.limit)
+    for hit in hits:
+        print(f"{hit.date}  {hit.score:>7.3f}  ×{hit.matches:<3} {hit.rel_path}")
+        print(f"    {make_snippet(args.root_path, hit, args.query)}")
+    if not hits:
+        print("没有找到匹配的日记")
+
+
+if __name__ == "__main__":
+    main()
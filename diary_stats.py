@@ -1,69 +1,52 @@
 import os
+import math
+import hashlib
+import sqlite3
 from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from datetime import datetime, date
 import re
-import jieba
 import pandas as pd
+from diary_cache import AnalysisCache
+from diary_index import get_diary_index
+from diary_rollup import DailyRollupStore, build_daily_rollup, rollup_totals
+from diary_wordfreq import WordFreqStore, day_signatures
+from diary_tokenizer import STATS_TOKENIZER, FULL_TOKENIZER, wait_for_jieba_init
+from diary_stopwords import get_stopword_service
+from diary_reader import READ_THREADS, read_ahead
+from utils.perf_utils import PerfRecorder, collecting, count, current_recorder, recording, stage
 
+# 分词/清洗规则有变化时需要递增，用于使旧的分析缓存失效
+TOKENIZER_VERSION = "1"
 
-def tokenize_text(text):
-    # 1. 先用正则匹配所有英文单词和网址，暂时抽取出来
-    # 匹配网址：https:// 或 http://开头，非空白字符直到空格
-    urls = re.findall(r'https?://[^\s]+', text)
-
-    # 匹配英文单词（连续字母，不拆分）
-    english_words = re.findall(r'\b[a-zA-Z]+\b', text)
-
-    # 2. 把网址和英文单词在文本里替换成特殊占位符，避免jieba分词拆分他们
-    placeholder = "URL_OR_ENGWORD"
-    text_tmp = text
-    for u in urls:
-        text_tmp = text_tmp.replace(u, placeholder)
-    for w in english_words:
-        text_tmp = text_tmp.replace(w, placeholder)
+# 待分析文件少于该数量时直接串行处理，避免进程池启动和 jieba 初始化的开销
+PARALLEL_MIN_FILES = 64
 
-    # 3. 用jieba分词，对替换后的文本做分词
-    words_cn = [w for w in jieba.cut(text_tmp) if w.strip() and w != placeholder]
 
-    # 4. 合并所有英文单词和网址（保持原样）
-    tokens = words_cn + english_words + urls
-
-    return tokens
+def tokenize_text(text):
+    """
+    完整分词：英文单词和网址保持原样，其余交给 jieba
+    与改为 DiaryTokenizer 之前的实现相比：网址只作为整体输出，其中的英文（https、docs、com 等）
+    不再重复计为单词；旧实现残留的占位符碎片（URL、OR、ENGWORD、_）也不再出现在结果中
+    """
+    return FULL_TOKENIZER.tokenize(text)
 
 
 def load_stopwords(stopwords_path=None):
-    if not stopwords_path:
-        stopwords_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "stopwords.txt")
-    if not os.path.exists(stopwords_path):
-        # 文件不存在，返回空集合，避免程序崩溃
-        return set()
-    with open(stopwords_path, 'r', encoding='utf-8') as f:
-        stopwords = set(word.strip() for word in f if word.strip())
-    return stopwords
+    """
+    返回停用词集合（frozenset）
+    由停用词服务按文件 mtime/size 缓存，文件未变化时不重新解析；文件不存在时返回空集合
+    """
+    return get_stopword_service(stopwords_path).get()
 
 
 def add_stopwords(new_words, stopwords_path=None):
     """
     向停用词文件中添加新词，避免重复
+    新词以追加行的方式写入，不再整体重写文件
     """
-    if not stopwords_path:
-        stopwords_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "stopwords.txt")
-
-    if isinstance(new_words, str):
-        new_words = {new_words}
-    else:
-        new_words = set(new_words)
-
-    # 加载已有的
-    current_stopwords = load_stopwords(stopwords_path)
-    updated_stopwords = current_stopwords | new_words
-
-    # 写回文件
-    with open(stopwords_path, 'w', encoding='utf-8') as f:
-        for word in sorted(updated_stopwords):
-            f.write(word + '\n')
-
-    return len(new_words - current_stopwords), len(updated_stopwords)
+    return get_stopword_service(stopwords_path).add(new_words)
 
 
 def extract_date_from_path(dirpath, filename, root_path):
@@ -93,114 +76,234 @@ def extract_date_from_path(dirpath, filename, root_path):
         return None
 
 
+# Markdown 清洗用到的正则，模块加载时编译一次
+_HTML_TAG_RE = re.compile(r'<[^>]+>')
+_IMAGE_RE = re.compile(r'!\[.*?\]\(.*?\)')
+_LINK_RE = re.compile(r'\[([^\]]+)\]\(https?://[^\)]+\)')
+_BARE_URL_RE = re.compile(r'https?://[^\s\)]+')
+_BLANK_LINES_RE = re.compile(r'\n{3,}')
+
+
 def clean_markdown_text(markdown_text):
+    # 各步骤的先后顺序会影响结果（如删除标签后才能匹配到图片），因此仍按原顺序执行；
+    # 每一步先用子串判断跳过不可能命中的替换，普通日记通常只需扫描几遍子串，不再整篇复制五次
+
     # 删除所有 HTML 标签
-    markdown_text = re.sub(r'<[^>]+>', '', markdown_text)
+    if '<' in markdown_text:
+        markdown_text = _HTML_TAG_RE.sub('', markdown_text)
 
     # 删除 Markdown 图片语法 ![alt](url)
-    markdown_text = re.sub(r'!\[.*?\]\(.*?\)', '', markdown_text)
+    if '![' in markdown_text:
+        markdown_text = _IMAGE_RE.sub('', markdown_text)
 
     # 删除 Markdown 超链接语法 [text](https://xxx)，保留 text
-    markdown_text = re.sub(r'\[([^\]]+)\]\(https?://[^\)]+\)', r'\1', markdown_text)
+    if '](http' in markdown_text:
+        markdown_text = _LINK_RE.sub(r'\1', markdown_text)
 
     # 删除裸露的 https 链接
-    markdown_text = re.sub(r'https?://[^\s\)]+', '', markdown_text)
+    if '://' in markdown_text:
+        markdown_text = _BARE_URL_RE.sub('', markdown_text)
 
     # 清除多余空行（3行及以上 → 2行）
-    markdown_text = re.sub(r'\n{3,}', '\n\n', markdown_text)
+    if '\n\n\n' in markdown_text:
+        markdown_text = _BLANK_LINES_RE.sub('\n\n', markdown_text)
 
     return markdown_text.strip()
 
 
-def collect_diary_data(root_path, stopwords_path=None, start_date=None, end_date=None):
+def analyze_diary_text(text, stopwords):
+    """分析已读取的日记文本，返回 (清洗后字数, 词频 Counter)"""
+    with stage('清洗'):
+        content = clean_markdown_text(text)
+
+    with stage('分词'):
+        words_all = STATS_TOKENIZER.tokenize(content)
+        words = [w.strip() for w in words_all if w.strip() and w.strip() not in stopwords]
+    count('分析文件')
+    count('词语数', len(words))
+    return len(content), Counter(words)
+
+
+def _analyze_serial(filepaths, stopwords):
+    """在当前进程中逐个分析，后续文件由读取线程预读，I/O 与分词重叠进行"""
+    results = []
+    threads = READ_THREADS if len(filepaths) > 1 else 0
+    for _, text, _ in read_ahead(filepaths, threads=threads):
+        if text is None:
+            count('读取失败')
+            results.append(None)
+        else:
+            results.append(analyze_diary_text(text, stopwords))
+    return results
+
+
+def _analyze_chunk(args):
+    filepaths, stopwords, track = args
+    if not track:
+        return _analyze_serial(filepaths, stopwords), None
+    # 父进程正在记录性能时，子进程为每块单独记录读取/清洗/分词的耗时并随结果返回
+    # （fork 启动的子进程会继承父进程当时的记录，不能直接沿用）
+    with collecting(PerfRecorder('analyze_chunk')) as recorder:
+        results = _analyze_serial(filepaths, stopwords)
+    return results, (recorder.stages, recorder.counters)
+
+
+def analyze_diary_files(filepaths, stopwords, workers=None, chunk_size=None):
     """
-    收集日记数据，支持按日期范围筛选
-    返回：
-    - dataframe
-    - 按年、月、日统计字数的字典（只有对应维度有多样值时才包含）
-    - 词频列表（前100）
+    批量分析日记文件，返回与 filepaths 顺序一致的结果列表
+    workers 默认为 CPU 核数；workers<=1 或文件较少时串行处理（读取线程预读），进程池不可用时也退化为串行
     """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers <= 1 or len(filepaths) < PARALLEL_MIN_FILES:
+        return _analyze_serial(filepaths, stopwords)
+
+    # 每个进程分到若干块，既减少进程间通信次数，又能在文件大小不均时均衡负载
+    if not chunk_size:
+        chunk_size = max(1, math.ceil(len(filepaths) / (workers * 4)))
+    chunks = [filepaths[i:i + chunk_size] for i in range(0, len(filepaths), chunk_size)]
+
+    recorder = current_recorder()
+    wait_for_jieba_init()
+    try:
+        results = []
+        # 各子进程的阶段耗时是累加的 CPU 时间，总墙钟时间记为“进程池分析”
+        with stage('进程池分析'):
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                args = [(chunk, stopwords, recorder is not None) for chunk in chunks]
+                for chunk_result, perf in executor.map(_analyze_chunk, args):
+                    results.extend(chunk_result)
+                    if perf is not None:
+                        recorder.merge(*perf)
+        count('进程数', workers)
+        return results
+    except (OSError, BrokenProcessPool):
+        return _analyze_serial(filepaths, stopwords)
+
+
+def analysis_version(stopwords_version):
+    """根据分词规则版本和停用词服务的版本号生成缓存版本号"""
+    digest = hashlib.sha1(TOKENIZER_VERSION.encode('utf-8'))
+    digest.update(stopwords_version.encode('utf-8'))
+    return digest.hexdigest()
+
+
+def open_analysis_cache(root_path, version):
+    """打开日记根目录下的分析缓存，目录不可写等情况下返回 None（退化为不使用缓存）"""
+    try:
+        return AnalysisCache(root_path, version)
+    except (OSError, sqlite3.Error):
+        return None
 
+
+def _to_date(value):
     # 如果传入的是 datetime.datetime，转换为 date 类型
-    if start_date and isinstance(start_date, datetime):
-        start_date = start_date.date()
-    if end_date and isinstance(end_date, datetime):
-        end_date = end_date.date()
+    if value and isinstance(value, datetime):
+        return value.date()
+    return value
+
 
+def analyze_items(root_path, items, stopwords, version, use_cache=True, workers=None, token_days=None):
+    """
+    分析索引返回的文件列表，返回 [(DiaryFile, 字数, 词频 Counter, 词语总数)]，读取失败的文件被跳过
+    token_days 不为 None 时，只有这些日期的缓存命中文件才解码词频，其余文件 Counter 为 None
+    """
+    cache = open_analysis_cache(root_path, version) if use_cache else None
+
+    # 先取缓存，只把未命中的文件交给（可能并行的）分析阶段
+    analyses = [None] * len(items)
+    if cache is not None:
+        with stage('缓存读取'):
+            for i, item in enumerate(items):
+                with_tokens = token_days is None or item.date in token_days
+                analyses[i] = cache.get(item.rel_path, item.mtime_ns, item.size, with_tokens=with_tokens)
+    missing = [i for i, analysis in enumerate(analyses) if analysis is None]
+    count('缓存命中', len(items) - len(missing) if cache is not None else 0)
+    count('缓存未命中', len(missing))
+    missing_results = analyze_diary_files(
+        [os.path.join(root_path, items[i].rel_path) for i in missing], stopwords, workers=workers
+    )
+    for i, analysis in zip(missing, missing_results):
+        if analysis is None:
+            continue
+        char_count, counter = analysis
+        analyses[i] = (char_count, counter, sum(counter.values()))
+        if cache is not None:
+            with stage('缓存写入'):
+                cache.put(items[i].rel_path, items[i].mtime_ns, items[i].size, char_count, counter)
+
+    if cache is not None:
+        with stage('缓存写入'):
+            cache.close()
+
+    return [(item,) + analysis for item, analysis in zip(items, analyses) if analysis is not None]
+
+
+def open_word_store(root_path, version):
+    """打开根目录下的增量词频存储，不可用时返回 None"""
+    try:
+        return WordFreqStore(root_path, version)
+    except (OSError, sqlite3.Error):
+        return None
+
+
+def build_result(records, word_counter=None):
+    """
+    由 [(DiaryFile, 字数, 词频 Counter, 词语总数)] 汇总出 collect_diary_data 的返回结果
+    word_counter 为已算好的区间词频（来自增量词频存储）时不再逐文件合并 Counter
+    """
     entries = []
-    stopwords = load_stopwords(stopwords_path)
-    word_counter = Counter()
-
-    for dirpath, _, filenames in os.walk(root_path):
-        for filename in filenames:
-            if not filename.endswith('.md'):
-                continue
-
-            date_obj = extract_date_from_path(dirpath, filename, root_path)
-            if not date_obj:
-                continue
-
-            # 日期筛选
-            if start_date and date_obj < start_date:
-                continue
-            if end_date and date_obj > end_date:
-                continue
-
-            filepath = os.path.join(dirpath, filename)
-            try:
-                with open(filepath, 'r', encoding='utf-8') as f:
-                    # 读取markdown
-                    content = clean_markdown_text(f.read())
-
-            except Exception:
-                continue
-
-            char_count = len(content)
-            # 增加英文词语
-            import re
-
-            def tokenize_text(text):
-                words_cn = [w for w in jieba.cut(text) if w.strip() and len(w) > 1]
-                # words_cn = [w for w in jieba.cut(text) if w.strip()]
-                words_en = re.findall(r'\b[a-zA-Z]+\b', text)
-                return words_cn + words_en
-
-            # 在循环里：
-            words_all = tokenize_text(content)
-            words = [w.strip() for w in words_all if w.strip() and w.strip() not in stopwords]
-            word_counter.update(words)
-
-            entries.append({
-                '文件名': filename,
-                '日期': date_obj.strftime('%Y-%m-%d'),
-                '年': date_obj.year,
-                '月': date_obj.month,
-                '日': date_obj.day,
-                '字数': char_count
-            })
+    merge_counters = word_counter is None
+    if merge_counters:
+        word_counter = Counter()
+    for item, char_count, file_counter, _ in records:
+        if merge_counters:
+            word_counter.update(file_counter)
+
+        date_obj = item.date
+        entries.append({
+            '文件名': os.path.basename(item.rel_path),
+            '日期': date_obj.strftime('%Y-%m-%d'),
+            '年': date_obj.year,
+            '月': date_obj.month,
+            '日': date_obj.day,
+            '字数': char_count
+        })
 
     df = pd.DataFrame(entries)
 
+    # 日汇总表：每个日期一行，年/月/日合计都由它向量化派生
+    rollup = build_daily_rollup(
+        [r[0].date for r in records], [r[1] for r in records], [r[3] for r in records]
+    )
+    return summarize_result(df, rollup, word_counter)
+
+
+def summarize_result(df, rollup, word_counter):
+    """
+    由明细 dataframe、日汇总表和区间词频得出 collect_diary_data 的返回结果
+    build_result 与多根目录合并（diary_multiroot.merge_results）共用这里的汇总规则
+    """
     # 只统计维度有多样值的情况
-    result = {"dataframe": df}
+    result = {"dataframe": df, "daily_rollup": rollup}
 
     if not df.empty:
-        if df['年'].nunique() > 1:
-            result["char_count_by_year"] = df.groupby("年")["字数"].sum().to_dict()
+        if rollup.index.year.nunique() > 1:
+            result["char_count_by_year"] = rollup_totals(rollup, 'Y')
         else:
             result["char_count_by_year"] = {}
 
-        if df[['年', '月']].drop_duplicates().shape[0] > 1:
+        if rollup.index.to_period('M').nunique() > 1:
             # 以字符串 "YYYY-MM" 为键
-            df['年-月'] = df.apply(lambda r: f"{r['年']}-{r['月']:02d}", axis=1)
-            result["char_count_by_month"] = df.groupby("年-月")["字数"].sum().to_dict()
+            df['年-月'] = df['日期'].str[:7]
+            result["char_count_by_month"] = rollup_totals(rollup, 'M')
         else:
             result["char_count_by_month"] = {}
 
-        if df[['年', '月', '日']].drop_duplicates().shape[0] > 1:
+        if len(rollup) > 1:
             # 以字符串 "YYYY-MM-DD" 为键
-            df['年-月-日'] = df.apply(lambda r: f"{r['年']}-{r['月']:02d}-{r['日']:02d}", axis=1)
-            result["char_count_by_day"] = df.groupby("年-月-日")["字数"].sum().to_dict()
+            df['年-月-日'] = df['日期']
+            result["char_count_by_day"] = rollup_totals(rollup, 'D')
         else:
             result["char_count_by_day"] = {}
 
@@ -212,3 +315,136 @@ def collect_diary_data(root_path, stopwords_path=None, start_date=None, end_date
         result["word_freq"] = []
 
     return result
+
+
+def _sync_daily_rollup(root_path, version, rollup, start_date, end_date):
+    """把本次计算的日汇总同步到根目录的持久化汇总表，只写入有变化的日期"""
+    try:
+        store = DailyRollupStore(root_path, version)
+        try:
+            store.sync(rollup, start_date, end_date)
+        finally:
+            store.close()
+    except (OSError, sqlite3.Error):
+        pass
+
+
+def _collect_ranges(root_path, date_ranges, stopwords_path=None, use_cache=True, workers=None, word_vectors=False):
+    """
+    collect_diary_data / collect_diary_data_multi 的公共实现
+    各区间的文件合并去重后只分析一次；启用缓存时区间词频由增量词频存储按 日/月/年 向量合并得到
+    """
+    with recording('collect_diary_data') as recorder:
+        results = _collect_ranges_recorded(root_path, date_ranges, stopwords_path, use_cache, workers, word_vectors)
+    perf = recorder.as_dict()
+    for result in results:
+        result["perf"] = perf
+    return results
+
+
+def _collect_ranges_recorded(root_path, date_ranges, stopwords_path, use_cache, workers, word_vectors):
+    if not os.path.isdir(root_path):
+        # 根目录不存在（例如路径输入有误）时与没有日记一样返回空结果，也不创建缓存目录
+        results = [build_result([]) for _ in date_ranges]
+        if word_vectors:
+            for result in results:
+                result["word_counter"] = Counter()
+        return results
+    stopwords, stopwords_version = get_stopword_service(stopwords_path).snapshot()
+    version = analysis_version(stopwords_version)
+
+    # 只列举与日期区间重叠的 年/年月 分区，无需遍历整个根目录
+    with stage('索引查询'):
+        index = get_diary_index(root_path)
+        unique_items = {}
+        for start_date, end_date in date_ranges:
+            for item in index.query(start_date, end_date):
+                unique_items.setdefault(item.rel_path, item)
+        items = sorted(unique_items.values(), key=lambda f: (f.date, f.rel_path))
+    count('扫描文件', len(items))
+
+    word_store = open_word_store(root_path, version) if use_cache else None
+    if word_store is not None:
+        # 只有文件有变化（或尚未入库）的日期才需要逐文件词频
+        with stage('词频存储同步'):
+            signatures = day_signatures(items)
+            stale_days = word_store.stale_days(signatures)
+        records = analyze_items(root_path, items, stopwords, version, use_cache, workers, token_days=stale_days)
+        day_counters = {d: Counter() for d in stale_days}
+        for item, _, file_counter, _ in records:
+            if item.date in day_counters:
+                day_counters[item.date].update(file_counter)
+        try:
+            with stage('词频存储同步'):
+                word_store.sync(signatures, day_counters, date_ranges)
+        except sqlite3.Error:
+            word_store.close()
+            word_store = None
+            records = analyze_items(root_path, items, stopwords, version, use_cache, workers)
+    else:
+        records = analyze_items(root_path, items, stopwords, version, use_cache, workers)
+
+    results = []
+    for start_date, end_date in date_ranges:
+        selected = [r for r in records
+                    if (not start_date or r[0].date >= start_date) and (not end_date or r[0].date <= end_date)]
+        with stage('区间词频'):
+            if word_store is not None:
+                vector = word_store.range_vector(start_date, end_date)
+                word_counter = word_store.vector_counter(vector)
+            elif word_vectors:
+                word_counter = Counter()
+                for _, _, file_counter, _ in selected:
+                    word_counter.update(file_counter)
+            else:
+                word_counter = None
+        with stage('汇总（pandas）'):
+            result = build_result(selected, word_counter)
+        if word_vectors:
+            # 有词频存储时给出按词 id 对齐的完整向量，否则给出完整 Counter（供 diary_compare 使用）
+            if word_store is not None:
+                result["word_vector"] = vector
+            else:
+                result["word_counter"] = word_counter
+        if use_cache:
+            with stage('日汇总同步'):
+                _sync_daily_rollup(root_path, version, result["daily_rollup"], start_date, end_date)
+        results.append(result)
+
+    if word_store is not None:
+        if word_vectors:
+            # 各区间共用同一份词表（向量可能比词表短：同步之后新增的词语排在后面）
+            terms = list(word_store.terms)
+            for result in results:
+                result["word_terms"] = terms
+        word_store.close()
+    return results
+
+
+def collect_diary_data(root_path, stopwords_path=None, start_date=None, end_date=None, use_cache=True,
+                       workers=None):
+    """
+    收集日记数据，支持按日期范围筛选
+    use_cache=True 时按文件 mtime/size 复用根目录下缓存的分析结果，只重新分析有变化的文件
+    workers 为分析未命中缓存文件时的进程数，默认 CPU 核数，传 1 则串行
+    返回：
+    - dataframe
+    - 按年、月、日统计字数的字典（只有对应维度有多样值时才包含）
+    - 词频列表（前100）
+    - 日汇总表 daily_rollup（每个日期一行：字数、文件数、词数）
+    """
+    date_range = (_to_date(start_date), _to_date(end_date))
+    return _collect_ranges(root_path, [date_range], stopwords_path, use_cache, workers)[0]
+
+
+def collect_diary_data_multi(root_path, date_ranges, stopwords_path=None, use_cache=True, workers=None,
+                             word_vectors=False):
+    """
+    一次性收集多个日期区间的日记数据
+    date_ranges 为 [(start_date, end_date), ...]，区间可以重叠，重叠部分的文件只读取、分词一次
+    返回与 date_ranges 顺序一致的结果列表，每项格式与 collect_diary_data 相同
+    word_vectors=True 时每项另外包含区间的完整词频：有词频存储时为 word_vector（下标为词 id）和
+    共用的词表 word_terms，否则为 word_counter；区间对比直接使用，无需再次同步
+    """
+    date_ranges = [(_to_date(s), _to_date(e)) for s, e in date_ranges]
+    return _collect_ranges(root_path, date_ranges, stopwords_path, use_cache, workers, word_vectors)
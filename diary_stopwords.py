@@ -0,0 +1,115 @@
+import os
+import hashlib
+import threading
+
+DEFAULT_STOPWORDS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "stopwords.txt")
+
+
+class StopwordService:
+    """
+    停用词服务
+    - 按文件 mtime/size 缓存解析结果，文件未变化时不重新读取
+    - version 为文件内容的 sha1，供下游缓存作为键
+    - 新增停用词以追加行的方式写入文件，并同步更新内存中的集合与版本号，无需整体重写和重新解析
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._stamp = None
+        self._words = frozenset()
+        self._digest = hashlib.sha1()
+        self._ends_with_newline = True
+
+    def _stat_stamp(self):
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def _reload_locked(self):
+        stamp = self._stat_stamp()
+        if stamp == self._stamp and (stamp is not None or not self._words):
+            return
+        digest = hashlib.sha1()
+        words = frozenset()
+        ends_with_newline = True
+        if stamp is not None:
+            with open(self.path, 'rb') as f:
+                data = f.read()
+            digest.update(data)
+            words = frozenset(w.strip() for w in data.decode('utf-8').splitlines() if w.strip())
+            ends_with_newline = not data or data.endswith(b'\n')
+        self._words, self._digest, self._stamp = words, digest, stamp
+        self._ends_with_newline = ends_with_newline
+
+    def get(self):
+        """返回当前停用词集合（frozenset），文件变化时自动重新加载"""
+        with self._lock:
+            self._reload_locked()
+            return self._words
+
+    def snapshot(self):
+        """同时返回 (停用词集合, 版本号)，保证两者对应同一份文件内容"""
+        with self._lock:
+            self._reload_locked()
+            return self._words, self._digest.hexdigest()
+
+    @property
+    def version(self):
+        with self._lock:
+            self._reload_locked()
+            return self._digest.hexdigest()
+
+    def add(self, new_words):
+        """
+        追加新停用词（已存在的忽略），返回 (新增数量, 当前总数)
+        """
+        if isinstance(new_words, str):
+            new_words = [new_words]
+        with self._lock:
+            self._reload_locked()
+            added = []
+            for word in new_words:
+                word = word.strip()
+                if word and word not in self._words and word not in added:
+                    added.append(word)
+            if not added:
+                return 0, len(self._words)
+
+            data = "".join(word + '\n' for word in added).encode('utf-8')
+            if not self._ends_with_newline:
+                data = b'\n' + data
+            with open(self.path, 'ab') as f:
+                f.write(data)
+
+            # 追加的内容直接并入摘要与集合，记录新的文件状态，下次读取不必重新解析
+            self._digest.update(data)
+            self._words = self._words | frozenset(added)
+            self._stamp = self._stat_stamp()
+            self._ends_with_newline = True
+            return len(added), len(self._words)
+
+    def filter(self, tokens):
+        """过滤词语流中的停用词（同时去除首尾空白和空词）"""
+        words = self.get()
+        for token in tokens:
+            token = token.strip()
+            if token and token not in words:
+                yield token
+
+
+_services = {}
+_services_lock = threading.Lock()
+
+
+def get_stopword_service(stopwords_path=None):
+    """按文件路径复用停用词服务，未指定路径时使用项目自带的 stopwords.txt"""
+    path = os.path.abspath(stopwords_path or DEFAULT_STOPWORDS_PATH)
+    with _services_lock:
+        service = _services.get(path)
+        if service is None:
+            service = StopwordService(path)
+            _services[path] = service
+        return service
@@ -0,0 +1,128 @@
+import os
+import re
+import threading
+from functools import lru_cache
+
+from utils.startup_utils import lazy_import, timed
+
+# jieba 在首次分词时才导入（导入本身和构建前缀词典都较慢）
+jieba = None
+
+# jieba 前缀词典缓存放在项目目录下，避免每次冷启动都重新构建，也不依赖系统临时目录
+JIEBA_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".jieba_cache")
+
+# 预编译的分词辅助正则
+_URL_RE = re.compile(r'https?://[^\s]+')
+_ENGLISH_RE = re.compile(r'\b[a-zA-Z]+\b')
+# 屏蔽英文/网址时用空格替换：空格本身就是 jieba 的分隔符，不会产生额外词语
+_MASK_RE = re.compile(r'https?://[^\s]+|\b[a-zA-Z]+\b')
+
+_init_lock = threading.Lock()
+_initialized = False
+
+
+def ensure_jieba_initialized():
+    """jieba 词典全进程只加载一次（首次分词前调用，线程安全）"""
+    global jieba, _initialized
+    if _initialized:
+        return
+    with _init_lock:
+        if not _initialized:
+            module = lazy_import('jieba')
+            try:
+                os.makedirs(JIEBA_CACHE_DIR, exist_ok=True)
+                module.dt.tmp_dir = JIEBA_CACHE_DIR
+            except OSError:
+                pass
+            with timed("jieba 词典初始化"):
+                module.initialize()
+            jieba = module
+            _initialized = True
+
+
+def prewarm_jieba():
+    """在后台线程中提前加载 jieba 词典，让界面先渲染；首次分词时若尚未完成会自动等待"""
+    if _initialized:
+        return None
+    thread = threading.Thread(target=ensure_jieba_initialized, name="jieba-prewarm", daemon=True)
+    thread.start()
+    return thread
+
+
+def wait_for_jieba_init():
+    """
+    创建进程池之前调用：等待其他线程（例如后台预热）中进行到一半的词典加载完成
+    fork 出的子进程会继承被占用的 _init_lock 和 jieba 内部的锁，却没有释放它们的线程，
+    首次分词时会永远阻塞；等待之后子进程直接继承已加载的词典。没有进行中的加载时立即返回
+    """
+    with _init_lock:
+        pass
+
+
+class DiaryTokenizer:
+    """
+    日记分词引擎
+    - min_length：jieba 中文分词结果的最小长度
+    - english：'append' 英文由 jieba 照常切分，另外用正则补充提取一遍（统计模块沿用的规则）；
+               'mask'   先把英文单词从文本中屏蔽再交给 jieba，英文单词原样单独输出
+    - keep_urls：是否把网址作为整体词语输出；开启时网址在提取英文单词之前整体移除，
+                 网址内部的英文（如 https、example、com）不再单独输出（否则网址只参与英文提取）
+    - memo_size：按段落缓存分词结果的 LRU 容量，模板等重复段落不再重复切分，0 表示不缓存
+    """
+
+    def __init__(self, min_length=2, english='append', keep_urls=False, memo_size=4096):
+        if english not in ('append', 'mask'):
+            raise ValueError(f"不支持的英文处理方式: {english}")
+        self.min_length = min_length
+        self.english = english
+        self.keep_urls = keep_urls
+        if memo_size:
+            self._tokenize_paragraph = lru_cache(maxsize=memo_size)(self._tokenize_paragraph)
+
+    def _tokenize_paragraph(self, paragraph):
+        urls = []
+        if self.keep_urls:
+            urls = _URL_RE.findall(paragraph)
+            paragraph = _URL_RE.sub(' ', paragraph)
+        words_en = _ENGLISH_RE.findall(paragraph)
+        if self.english == 'mask':
+            paragraph = _MASK_RE.sub(' ', paragraph)
+        min_length = self.min_length
+        words_cn = [w for w in jieba.cut(paragraph) if w.strip() and len(w) >= min_length]
+        return tuple(words_cn + words_en + urls)
+
+    def tokenize(self, text):
+        """
+        分词并返回词语列表
+        按行切分后逐段分词：换行本身就是 jieba 和英文正则的分隔边界，结果与整篇分词一致
+        """
+        ensure_jieba_initialized()
+        tokens = []
+        for paragraph in text.split('\n'):
+            if paragraph.strip():
+                tokens.extend(self._tokenize_paragraph(paragraph))
+        return tokens
+
+
+def cut_sequence(text):
+    """
+    按原文顺序切分词语（英文转小写，去掉空白和纯标点），供全文检索记录词语位置
+    与 DiaryTokenizer 不同：不过滤单字，也不把英文单词移到结尾
+    """
+    ensure_jieba_initialized()
+    tokens = []
+    for paragraph in text.split('\n'):
+        if not paragraph.strip():
+            continue
+        for token in jieba.cut(paragraph):
+            token = token.strip().lower()
+            if token and any(ch.isalnum() for ch in token):
+                tokens.append(token)
+    return tokens
+
+
+# 统计用分词：中文词至少两个字，英文单词额外补充
+STATS_TOKENIZER = DiaryTokenizer(min_length=2, english='append')
+
+# 完整分词：保留单字，英文单词与网址作为整体输出（网址内部的英文不再拆出单词）
+FULL_TOKENIZER = DiaryTokenizer(min_length=1, english='mask', keep_urls=True)
@@ -0,0 +1,161 @@
+"""
+词语趋势
+由增量词频存储中每天的稀疏词频构建 词语 × 日期 的 CSR 矩阵（纯 NumPy，安装了 SciPy 时可转换为 scipy.sparse）
+任意词语的日/周/月序列、滑动平均、两个区间之间变化最大的词语都由矩阵一次性向量化计算
+"""
+import sqlite3
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+from diary_stats import analysis_version, collect_diary_data, open_word_store, _to_date
+from diary_stopwords import get_stopword_service
+
+# 序列粒度 -> pandas 重采样规则（周从周一开始，按周一和月初标注）
+FREQ_RULES = {'D': 'D', 'W': 'W-MON', 'M': 'MS'}
+
+
+class TermTrends:
+    """
+    词语 × 日期 的稀疏矩阵
+    - 行为词语（下标与词频存储的词 id 一致），列为从 start 开始的连续日期
+    - indptr / indices / data 与 CSR 格式相同，取某个词语的序列只访问该词的非零项
+    """
+
+    def __init__(self, terms, start_ordinal, n_days, term_ids, day_idx, counts):
+        self.terms = terms
+        self._term_index = {term: i for i, term in enumerate(terms)}
+        self.start = date.fromordinal(start_ordinal)
+        self.dates = pd.date_range(self.start, periods=n_days, freq='D')
+        n_terms = len(terms)
+
+        # 按日期排列的原始三元组，用于按区间汇总
+        self._entry_terms = term_ids
+        self._entry_days = day_idx
+        self._entry_counts = counts
+
+        # 稳定排序后同一词语的项仍按日期有序
+        order = np.argsort(term_ids, kind='stable')
+        self.indices = day_idx[order]
+        self.data = counts[order]
+        self.indptr = np.zeros(n_terms + 1, dtype=np.int64)
+        np.cumsum(np.bincount(term_ids, minlength=n_terms), out=self.indptr[1:])
+        self.day_totals = np.bincount(day_idx, weights=counts, minlength=n_days).astype(np.int64)
+
+    @classmethod
+    def from_day_rows(cls, terms, day_rows, start_date=None, end_date=None):
+        """由 WordFreqStore.day_rows 的结果构建；区间端点为 None 时取有数据的最早/最晚日期"""
+        empty = np.zeros(0, dtype=np.int64)
+        if day_rows:
+            first = start_date.toordinal() if start_date else day_rows[0][0]
+            last = end_date.toordinal() if end_date else day_rows[-1][0]
+        else:
+            first = (start_date or end_date or date.today()).toordinal()
+            last = end_date.toordinal() if end_date else first - 1
+        term_ids = np.concatenate([empty] + [ids for _, ids, _ in day_rows])
+        counts = np.concatenate([empty] + [c for _, _, c in day_rows])
+        day_idx = np.repeat(np.fromiter((o - first for o, _, _ in day_rows), dtype=np.int64, count=len(day_rows)),
+                            [len(ids) for _, ids, _ in day_rows])
+        return cls(list(terms), first, max(last - first + 1, 0), term_ids, day_idx, counts)
+
+    @property
+    def shape(self):
+        return len(self.terms), len(self.dates)
+
+    def to_scipy(self):
+        """转换为 scipy.sparse.csr_matrix（需要安装 SciPy）"""
+        from scipy.sparse import csr_matrix
+        return csr_matrix((self.data, self.indices, self.indptr), shape=self.shape)
+
+    def term_vector(self, term):
+        """词语每天的出现次数（稠密数组，长度等于日期数），未出现过的词语全为 0"""
+        vector = np.zeros(len(self.dates), dtype=np.int64)
+        i = self._term_index.get(term)
+        if i is not None:
+            lo, hi = self.indptr[i], self.indptr[i + 1]
+            vector[self.indices[lo:hi]] = self.data[lo:hi]
+        return vector
+
+    def _resample(self, values, freq):
+        series = pd.Series(values, index=self.dates)
+        if freq == 'D':
+            return series
+        return series.resample(FREQ_RULES[freq], label='left', closed='left').sum()
+
+    def series(self, term, freq='D', window=None, relative=False):
+        """
+        词语的时间序列
+        freq：'D' 日 / 'W' 周 / 'M' 月；window：滑动平均的窗口（按 freq 的周期数）
+        relative=True 时为每千词中的出现次数，消除每天写作量不同的影响
+        """
+        return self.frame([term], freq, window, relative)[term]
+
+    def frame(self, terms, freq='D', window=None, relative=False):
+        """多个词语的序列合并为一个 DataFrame（列为词语）"""
+        if freq not in FREQ_RULES:
+            raise ValueError(f"不支持的粒度: {freq}")
+        frame = pd.DataFrame({term: self._resample(self.term_vector(term), freq) for term in terms})
+        if frame.empty:
+            frame = pd.DataFrame(index=self._resample(self.day_totals, freq).index, columns=list(terms), dtype=float)
+        if relative:
+            totals = self._resample(self.day_totals, freq).replace(0, np.nan)
+            frame = frame.div(totals, axis=0).fillna(0) * 1000
+        if window and window > 1:
+            frame = frame.rolling(window, min_periods=1).mean()
+        frame.index.name = '日期'
+        return frame
+
+    def period_counts(self, start_date=None, end_date=None):
+        """区间内每个词语的合计次数（长度等于词语数的向量）"""
+        lo = (start_date - self.start).days if start_date else 0
+        hi = (end_date - self.start).days if end_date else len(self.dates) - 1
+        mask = (self._entry_days >= lo) & (self._entry_days <= hi)
+        return np.bincount(self._entry_terms[mask], weights=self._entry_counts[mask],
+                           minlength=len(self.terms)).astype(np.int64)
+
+    def top_movers(self, period_1, period_2, k=20, min_count=3):
+        """
+        比较两个区间，返回出现频率上升、下降最多的各 k 个词语
+        以平滑后的词频占比的对数比（log2）衡量变化，两区间合计少于 min_count 次的词语不参与排名
+        返回按对数比从高到低排列的 DataFrame：词语、区间1、区间2、变化、对数比
+        """
+        c1 = self.period_counts(*period_1)
+        c2 = self.period_counts(*period_2)
+        vocab = len(self.terms)
+        log_ratio = np.log2((c2 + 1) / (c2.sum() + vocab)) - np.log2((c1 + 1) / (c1.sum() + vocab))
+        candidates = np.flatnonzero(c1 + c2 >= min_count)
+        if not len(candidates):
+            return pd.DataFrame(columns=['词语', '区间1', '区间2', '变化', '对数比'])
+        ratios = log_ratio[candidates]
+        k = min(k, len(candidates))
+        rising = candidates[np.argpartition(-ratios, k - 1)[:k]]
+        falling = candidates[np.argpartition(ratios, k - 1)[:k]]
+        picked = np.unique(np.concatenate([rising, falling]))
+        result = pd.DataFrame({
+            '词语': [self.terms[i] for i in picked],
+            '区间1': c1[picked],
+            '区间2': c2[picked],
+            '变化': c2[picked] - c1[picked],
+            '对数比': np.round(log_ratio[picked], 3),
+        })
+        return result.sort_values('对数比', ascending=False, ignore_index=True)
+
+
+def build_term_trends(root_path, start_date=None, end_date=None, stopwords_path=None):
+    """
+    构建区间内（默认整个日记库）的词语趋势矩阵
+    先通过 collect_diary_data 把有变化的日期同步进增量词频存储，再直接读取每天的稀疏词频
+    """
+    start_date, end_date = _to_date(start_date), _to_date(end_date)
+    collect_diary_data(root_path, stopwords_path, start_date, end_date)
+    _, stopwords_version = get_stopword_service(stopwords_path).snapshot()
+    store = open_word_store(root_path, analysis_version(stopwords_version))
+    if store is None:
+        raise sqlite3.OperationalError("无法打开词频存储")
+    try:
+        day_rows = store.day_rows(start_date, end_date)
+        terms = list(store.terms)
+    finally:
+        store.close()
+    return TermTrends.from_day_rows(terms, day_rows, start_date, end_date)
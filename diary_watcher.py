@@ -0,0 +1,333 @@
+"""
+日记目录监听服务
+监听日记根目录中 .md 文件的新增、修改、删除，只对受影响的日期增量更新
+分析缓存、日汇总表和增量词频存储，之后读取统计结果无需重新扫描整个根目录
+
+优先使用 watchdog（inotify / FSEvents / ReadDirectoryChangesW），未安装时退化为定时轮询
+
+用法：python diary_watcher.py <日记根目录> [--stopwords stopwords.txt] [--poll] [--interval 2]
+"""
+import os
+import time
+import queue
+import argparse
+import threading
+from calendar import monthrange
+from collections import Counter, defaultdict
+from datetime import date
+
+from diary_index import get_diary_index
+from diary_rollup import DailyRollupStore, build_daily_rollup, rollup_totals
+from diary_search import open_search_index
+from diary_stats import (analysis_version, collect_diary_data, extract_date_from_path, open_word_store,
+                         analyze_items)
+from diary_stopwords import get_stopword_service
+from diary_wordfreq import day_signatures
+
+# 需要处理的 watchdog 事件类型
+_CONTENT_EVENTS = {'created', 'deleted', 'modified', 'moved'}
+
+
+def _month_days(year, month):
+    return [date(year, month, day) for day in range(1, monthrange(year, month)[1] + 1)]
+
+
+def affected_days(root_path, path, is_directory=False):
+    """
+    变化的路径 -> 受影响的日期列表
+    - .md 文件：按 extract_date_from_path 的规则解析出的日期
+    - 年份/年月目录整体新增、删除、移动：该年/该月的所有日期
+    其他路径（缓存目录、图片等）返回空列表
+    """
+    rel_path = os.path.relpath(path, root_path).replace("\\", "/")
+    if rel_path.startswith(".."):
+        return []
+    parts = rel_path.split("/")
+    if not is_directory:
+        if not parts[-1].endswith('.md'):
+            return []
+        day = extract_date_from_path(os.path.dirname(path), parts[-1], root_path)
+        return [day] if day else []
+
+    try:
+        year = int(parts[0])
+        if len(parts) == 1:
+            return [d for month in range(1, 13) for d in _month_days(year, month)]
+        month = int(parts[1][-2:])
+        return _month_days(year, month) if 1 <= month <= 12 else []
+    except ValueError:
+        return []
+
+
+class DiaryUpdater:
+    """把变化的日期增量应用到根目录下的各项缓存，耗时只与变化的日期数有关"""
+
+    def __init__(self, root_path, stopwords_path=None):
+        self.root_path = root_path
+        self.stopwords_path = stopwords_path
+
+    def apply(self, days):
+        """重新统计这些日期（其余日期不受影响），返回 {日期: 当天字数}，当天已无日记时为 None"""
+        days = set(days)
+        if not days:
+            return {}
+        stopwords, stopwords_version = get_stopword_service(self.stopwords_path).snapshot()
+        version = analysis_version(stopwords_version)
+
+        # 按月查询索引：只刷新受影响的 年/年月 分区
+        index = get_diary_index(self.root_path)
+        months = defaultdict(set)
+        for d in days:
+            months[(d.year, d.month)].add(d)
+        items = []
+        for (year, month), month_days in months.items():
+            first = date(year, month, 1)
+            last = date(year, month, monthrange(year, month)[1])
+            items += [f for f in index.query(first, last) if f.date in month_days]
+
+        # 未修改的文件直接命中分析缓存，只有变化的文件会重新读取、分词
+        records = analyze_items(self.root_path, items, stopwords, version, workers=1)
+        live_days = {r[0].date for r in records}
+        removed_days = days - live_days
+
+        word_store = open_word_store(self.root_path, version)
+        if word_store is not None:
+            try:
+                day_counters = defaultdict(Counter)
+                for item, _, file_counter, _ in records:
+                    day_counters[item.date].update(file_counter)
+                ranges = [(d, d) for d in sorted(removed_days)]
+                word_store.sync(day_signatures([r[0] for r in records]), dict(day_counters), ranges)
+            finally:
+                word_store.close()
+
+        # 倒排索引同样只重新索引这些日期中变化的文件
+        search_index = open_search_index(self.root_path)
+        if search_index is not None:
+            try:
+                search_index.sync(items, [(d, d) for d in sorted(days)])
+            finally:
+                search_index.close()
+
+        rollup = build_daily_rollup(
+            [r[0].date for r in records], [r[1] for r in records], [r[3] for r in records]
+        )
+        store = DailyRollupStore(self.root_path, version)
+        try:
+            store.update_days(rollup)
+            store.remove_days(sorted(removed_days))
+        finally:
+            store.close()
+
+        changes = dict.fromkeys(removed_days)
+        changes.update((ts.date(), int(count)) for ts, count in rollup['字数'].items())
+        return changes
+
+    def stats(self, start_date=None, end_date=None, top=100):
+        """
+        直接从日汇总表和增量词频存储读取区间统计，不访问日记文件
+        返回 daily_rollup、按年/月/日的字数合计和前 top 个高频词
+        """
+        _, stopwords_version = get_stopword_service(self.stopwords_path).snapshot()
+        version = analysis_version(stopwords_version)
+        store = DailyRollupStore(self.root_path, version)
+        try:
+            rollup = store.load(start_date, end_date)
+        finally:
+            store.close()
+        word_freq = []
+        word_store = open_word_store(self.root_path, version)
+        if word_store is not None:
+            try:
+                word_freq = word_store.range_counter(start_date, end_date).most_common(top)
+            finally:
+                word_store.close()
+        return {
+            "daily_rollup": rollup,
+            "char_count_by_year": rollup_totals(rollup, 'Y'),
+            "char_count_by_month": rollup_totals(rollup, 'M'),
+            "char_count_by_day": rollup_totals(rollup, 'D'),
+            "word_freq": word_freq,
+        }
+
+
+class DiaryWatcher:
+    """
+    后台监听日记根目录，把变化批量交给 DiaryUpdater
+    - debounce：收到事件后再等待这么久，把连续保存产生的多次事件合并为一次更新
+    - generation：每完成一次更新加一，可作为界面缓存的失效标记
+    - on_update(changes)：每次更新后的回调，参数同 DiaryUpdater.apply 的返回值
+    """
+
+    def __init__(self, root_path, stopwords_path=None, use_watchdog=True, poll_interval=2.0, debounce=0.5,
+                 on_update=None):
+        self.root_path = os.path.abspath(root_path)
+        self.updater = DiaryUpdater(self.root_path, stopwords_path)
+        self.use_watchdog = use_watchdog
+        self.poll_interval = poll_interval
+        self.debounce = debounce
+        self.on_update = on_update
+        self.backend = None
+        self.generation = 0
+        self.last_error = None
+        self._events = queue.Queue()
+        self._stop = threading.Event()
+        self._idle = threading.Event()
+        self._idle.set()
+        self._threads = []
+        self._observer = None
+        self._snapshot = None
+
+    def start(self, initial_sync=True):
+        """
+        启动监听；initial_sync=True 时先完整统计一次，使各项缓存与磁盘一致
+        返回实际使用的方式：'watchdog' 或 'polling'
+        """
+        if not os.path.isdir(self.root_path):
+            raise FileNotFoundError(f"日记根目录不存在：{self.root_path}")
+        if initial_sync:
+            collect_diary_data(self.root_path, self.updater.stopwords_path)
+        if self.use_watchdog and self._start_watchdog():
+            self.backend = 'watchdog'
+        else:
+            self.backend = 'polling'
+            self._snapshot = self._take_snapshot()
+            self._spawn(self._poll_loop, "diary-watcher-poll")
+        self._spawn(self._update_loop, "diary-watcher")
+        return self.backend
+
+    def _spawn(self, target, name):
+        thread = threading.Thread(target=target, name=name, daemon=True)
+        thread.start()
+        self._threads.append(thread)
+
+    def _start_watchdog(self):
+        try:
+            from watchdog.observers import Observer
+            from watchdog.events import FileSystemEventHandler
+        except ImportError:
+            return False
+
+        watcher = self
+
+        class _Handler(FileSystemEventHandler):
+            def on_any_event(self, event):
+                # 只关心内容变化：读取文件产生的 opened/closed 事件会让更新自身触发新的更新
+                # 目录的 modified 事件只表示其中有文件变化，具体文件另有事件
+                if event.event_type not in _CONTENT_EVENTS:
+                    return
+                if event.is_directory and event.event_type == 'modified':
+                    return
+                for path in (event.src_path, getattr(event, 'dest_path', '')):
+                    if path:
+                        watcher.notify(path, event.is_directory)
+
+        try:
+            observer = Observer()
+            observer.schedule(_Handler(), self.root_path, recursive=True)
+            observer.start()
+        except OSError:
+            return False
+        self._observer = observer
+        return True
+
+    def notify(self, path, is_directory=False):
+        """登记一个变化的路径（watchdog 回调和轮询都通过这里提交）"""
+        days = affected_days(self.root_path, os.fsdecode(path), is_directory)
+        if days:
+            # 先入队再清除空闲标记：更新线程只会在队列为空时重新置位
+            self._events.put(days)
+            self._idle.clear()
+
+    def _take_snapshot(self):
+        return {f.rel_path: (f.size, f.mtime_ns) for f in get_diary_index(self.root_path).query()}
+
+    def _poll_loop(self):
+        # 轮询借助 DiaryIndex：目录 mtime 未变的分区不重新列举，只 stat 已知文件
+        while not self._stop.wait(self.poll_interval):
+            try:
+                snapshot = self._take_snapshot()
+            except Exception as e:
+                self.last_error = e
+                continue
+            old = self._snapshot
+            for rel_path in set(old) | set(snapshot):
+                if old.get(rel_path) != snapshot.get(rel_path):
+                    self.notify(os.path.join(self.root_path, rel_path))
+            self._snapshot = snapshot
+
+    def _update_loop(self):
+        while not self._stop.is_set():
+            try:
+                days = set(self._events.get(timeout=0.2))
+            except queue.Empty:
+                if self._events.empty():
+                    self._idle.set()
+                continue
+            # 合并防抖时间内陆续到达的事件
+            deadline = time.monotonic() + self.debounce
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    days.update(self._events.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            try:
+                changes = self.updater.apply(days)
+                self.generation += 1
+                if self.on_update:
+                    self.on_update(changes)
+            except Exception as e:
+                # 单次更新失败不终止监听，下次变化或完整统计时会自然修正
+                self.last_error = e
+            if self._events.empty():
+                self._idle.set()
+
+    def wait_idle(self, timeout=None):
+        """等待已登记的变化全部处理完毕（便于脚本和测试中使用），超时返回 False"""
+        return self._idle.wait(timeout)
+
+    def stats(self, start_date=None, end_date=None, top=100):
+        return self.updater.stats(start_date, end_date, top)
+
+    def stop(self):
+        self._stop.set()
+        if self._observer is not None:
+            self._observer.stop()
+            self._observer.join()
+            self._observer = None
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+
+def main():
+    parser = argparse.ArgumentParser(description="监听日记目录并增量更新统计")
+    parser.add_argument("root_path")
+    parser.add_argument("--stopwords")
+    parser.add_argument("--poll", action="store_true", help="不使用 watchdog，定时轮询")
+    parser.add_argument("--interval", type=float, default=2.0, help="轮询间隔（秒）")
+    args = parser.parse_args()
+    if not os.path.isdir(args.root_path):
+        parser.error(f"日记根目录不存在：{args.root_path}")
+
+    def report(changes):
+        for day, char_count in sorted(changes.items()):
+            print(f"{day}  {'已删除' if char_count is None else f'{char_count} 字'}")
+
+    watcher = DiaryWatcher(args.root_path, args.stopwords, use_watchdog=not args.poll,
+                           poll_interval=args.interval, on_update=report)
+    print(f"正在监听 {watcher.root_path}（{watcher.start()}），按 Ctrl+C 退出")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        watcher.stop()
+
+
+if __name__ == "__main__":
+    main()
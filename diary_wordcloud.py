@@ -0,0 +1,250 @@
+import os
+import hashlib
+import threading
+from collections import namedtuple
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import lru_cache
+
+from utils.perf_utils import count, recording, stage
+from utils.startup_utils import lazy_import
+
+# 自动选择可用字体（支持中英文），整个进程只探测一次
+FONT_CANDIDATES = [
+    r"C:/Windows/Fonts/msyh.ttc",  # Windows
+    r"/System/Library/Fonts/PingFang.ttc",  # macOS
+    r"/usr/share/fonts/truetype/noto/NotoSansCJK-Regular.ttc",  # Linux
+]
+
+WORDCLOUD_WIDTH = 800
+WORDCLOUD_HEIGHT = 400
+WORDCLOUD_BACKGROUND = 'white'
+
+# 图片缓存目录（wordclouds、compare_clouds）的容量上限，超出后按最近使用时间淘汰
+CACHE_MAX_FILES = 50
+CACHE_MAX_BYTES = 50 * 1024 * 1024
+
+# 预览图的缩放比例：词云布局耗时与面积成正比，半尺寸约快 4 倍
+PREVIEW_SCALE = 0.5
+PREVIEW_DPI = 80
+
+# 对比图完整尺寸的分辨率；标题字体优先使用词云的字体文件，找不到时与原来一样按名称使用 SimHei
+COMPARE_DPI = 200
+TITLE_FONT_FAMILIES = ['SimHei', 'sans-serif']
+
+# 后台渲染线程数；wordcloud 与 matplotlib 的 OO 接口可以在线程中使用，不需要进程池
+# 预览图使用独立的线程池，不会排在耗时的完整尺寸渲染之后
+RENDER_WORKERS = 2
+PREVIEW_WORKERS = 1
+
+# 提交给后台渲染的图片：key 为内容地址，path 为生成后的文件路径，future 完成时返回 path
+ImageJob = namedtuple('ImageJob', ['key', 'path', 'future'])
+
+
+@lru_cache(maxsize=None)
+def resolve_font_path():
+    return next((f for f in FONT_CANDIDATES if os.path.isfile(f)), None)
+
+
+def wordcloud_key(word_freq, width=WORDCLOUD_WIDTH, height=WORDCLOUD_HEIGHT, font_path=None,
+                  background_color=WORDCLOUD_BACKGROUND, colormap=None):
+    """词云内容地址：词频表 + 尺寸 + 字体 + 配色的摘要，相同输入必然得到相同图片"""
+    digest = hashlib.sha1()
+    digest.update(f"{width}x{height}\0{font_path}\0{background_color}\0{colormap}\n".encode('utf-8'))
+    for word, freq in word_freq:
+        digest.update(f"{word}\0{freq}\n".encode('utf-8'))
+    return digest.hexdigest()[:20]
+
+
+def render_wordcloud(word_freq, width=WORDCLOUD_WIDTH, height=WORDCLOUD_HEIGHT, font_path=None,
+                     background_color=WORDCLOUD_BACKGROUND, colormap=None):
+    """生成 WordCloud 对象（布局计算较慢，优先使用 get_wordcloud_image 的缓存结果）"""
+    # wordcloud 只在真正生成词云时才导入
+    WordCloud = lazy_import('wordcloud').WordCloud
+    options = {}
+    if colormap:
+        options['colormap'] = colormap
+    return WordCloud(
+        font_path=font_path,
+        width=width,
+        height=height,
+        background_color=background_color,
+        **options
+    ).generate_from_frequencies(dict(word_freq))
+
+
+def evict_cache_dir(cache_dir, max_files=CACHE_MAX_FILES, max_bytes=CACHE_MAX_BYTES, keep=None):
+    """
+    按最近使用时间（mtime）淘汰目录中的 PNG，直到数量和总大小都不超过上限
+    keep 为刚生成/刚使用、不应被淘汰的文件名
+    """
+    entries = []
+    try:
+        with os.scandir(cache_dir) as it:
+            for entry in it:
+                if entry.is_file() and entry.name.endswith('.png') and not entry.name.startswith('.'):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime_ns, stat.st_size, entry.name))
+    except OSError:
+        return 0
+    entries.sort(reverse=True)
+    total_bytes = sum(size for _, size, _ in entries)
+    removed = 0
+    while entries and (len(entries) > max_files or total_bytes > max_bytes):
+        _, size, name = entries.pop()
+        if name == keep:
+            continue
+        try:
+            os.remove(os.path.join(cache_dir, name))
+        except OSError:
+            continue
+        total_bytes -= size
+        removed += 1
+    return removed
+
+
+def get_cached_image(cache_dir, prefix, key, render, max_files=CACHE_MAX_FILES, max_bytes=CACHE_MAX_BYTES,
+                     perf_name='图片缓存'):
+    """
+    按内容地址取得图片路径：已存在则直接复用（并刷新使用时间），否则调用 render(path) 生成
+    先写入隐藏的临时文件再改名，并发重跑时不会读到写了一半的图片
+    整个过程（缓存命中/未命中计数和 render 中的各阶段）记录到性能记录 perf_name；
+    本函数通常在渲染线程中执行，调用方线程的记录不会延续到这里
+    """
+    with recording(perf_name):
+        os.makedirs(cache_dir, exist_ok=True)
+        filename = f"{prefix}_{key}.png"
+        path = os.path.join(cache_dir, filename)
+        if os.path.isfile(path):
+            count('图片缓存命中')
+            try:
+                os.utime(path)
+            except OSError:
+                pass
+            return path
+        count('图片缓存未命中')
+
+        tmp_path = os.path.join(cache_dir, f".{prefix}_{key}.{os.getpid()}.{threading.get_ident()}.png")
+        try:
+            render(tmp_path)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        evict_cache_dir(cache_dir, max_files, max_bytes, keep=filename)
+        return path
+
+
+def _wordcloud_job(word_freq, width, height, background_color, colormap):
+    font_path = resolve_font_path()
+    key = wordcloud_key(word_freq, width, height, font_path, background_color, colormap)
+
+    def render(path):
+        # 由 get_cached_image 在“词云渲染”记录中调用
+        with stage('布局'):
+            wordcloud = render_wordcloud(word_freq, width, height, font_path, background_color, colormap)
+        with stage('保存图片'):
+            wordcloud.to_file(path)
+        count('词语数', len(word_freq))
+        count('像素', width * height)
+
+    return key, render
+
+
+def get_wordcloud_image(cache_dir, word_freq, width=WORDCLOUD_WIDTH, height=WORDCLOUD_HEIGHT,
+                        background_color=WORDCLOUD_BACKGROUND, colormap=None):
+    """返回词云 PNG 路径，词频表和样式不变时不会重新布局"""
+    key, render = _wordcloud_job(word_freq, width, height, background_color, colormap)
+    return get_cached_image(cache_dir, "wordcloud", key, render, perf_name='词云渲染')
+
+
+# ---- 后台渲染 ----
+
+_render_pools = {}
+_pending = {}
+_pending_lock = threading.Lock()
+
+
+def get_render_pool(preview=False):
+    with _pending_lock:
+        pool = _render_pools.get(preview)
+        if pool is None:
+            pool = ThreadPoolExecutor(max_workers=PREVIEW_WORKERS if preview else RENDER_WORKERS,
+                                      thread_name_prefix="render-preview" if preview else "render")
+            _render_pools[preview] = pool
+        return pool
+
+
+def _forget_pending(path):
+    with _pending_lock:
+        _pending.pop(path, None)
+
+
+def submit_cached_image(cache_dir, prefix, key, render, preview=False, perf_name='图片缓存'):
+    """
+    get_cached_image 的异步版本，立即返回 ImageJob
+    - 图片已在缓存中：返回已完成的 future
+    - 同一张图片正在渲染（例如页面重跑）：复用进行中的 future，不重复提交
+    """
+    path = os.path.join(cache_dir, f"{prefix}_{key}.png")
+    if os.path.isfile(path):
+        future = Future()
+        future.set_result(get_cached_image(cache_dir, prefix, key, render, perf_name=perf_name))
+        return ImageJob(key, path, future)
+
+    with _pending_lock:
+        future = _pending.get(path)
+        submitted = future is None
+    if submitted:
+        future = get_render_pool(preview).submit(get_cached_image, cache_dir, prefix, key, render,
+                                                 perf_name=perf_name)
+        with _pending_lock:
+            future = _pending.setdefault(path, future)
+        future.add_done_callback(lambda _: _forget_pending(path))
+    return ImageJob(key, path, future)
+
+
+def submit_wordcloud_image(cache_dir, word_freq, preview=False, background_color=WORDCLOUD_BACKGROUND,
+                           colormap=None):
+    """在后台渲染词云，preview=True 时按 PREVIEW_SCALE 缩小尺寸，用于先行展示"""
+    scale = PREVIEW_SCALE if preview else 1
+    key, render = _wordcloud_job(list(word_freq), int(WORDCLOUD_WIDTH * scale), int(WORDCLOUD_HEIGHT * scale),
+                                 background_color, colormap)
+    return submit_cached_image(cache_dir, "wordcloud", key, render, preview, perf_name='词云渲染')
+
+
+def submit_compare_image(cache_dir, wordcloud_jobs, titles, preview=False):
+    """
+    把若干张词云并排拼成对比图，在后台渲染
+    对比图只依赖各词云的内容地址，并在同一线程池中排在词云之后：词云先提交、先执行，因此等待不会死锁
+    """
+    dpi = PREVIEW_DPI if preview else COMPARE_DPI
+    font_path = resolve_font_path()
+    digest = hashlib.sha1()
+    digest.update(f"{dpi}\0{font_path}\0{'|'.join(titles)}\n".encode('utf-8'))
+    for job in wordcloud_jobs:
+        digest.update(job.key.encode('utf-8') + b'\n')
+
+    def render(path):
+        # 使用 Figure 而不是 pyplot：pyplot 的全局状态不是线程安全的
+        Figure = lazy_import('matplotlib.figure').Figure
+        imread = lazy_import('matplotlib.image').imread
+        FontProperties = lazy_import('matplotlib.font_manager').FontProperties
+        # 不依赖 pyplot 的 rcParams，中文字体直接设置在标题上
+        if font_path:
+            title_font = FontProperties(fname=font_path)
+        else:
+            title_font = FontProperties(family=TITLE_FONT_FAMILIES)
+        fig = Figure(figsize=(14, 6), dpi=dpi)
+        axes = fig.subplots(1, len(wordcloud_jobs))
+        for ax, job, title in zip(axes, wordcloud_jobs, titles):
+            with stage('等待词云'):
+                image_path = job.future.result()
+            with stage('绘制'):
+                ax.imshow(imread(image_path), interpolation='bilinear')
+                ax.axis("off")
+                ax.set_title(title, fontproperties=title_font)
+        with stage('保存图片'):
+            fig.savefig(path, bbox_inches='tight')
+
+    return submit_cached_image(cache_dir, "compare_wordclouds", digest.hexdigest()[:20], render, preview,
+                               perf_name='对比图渲染')
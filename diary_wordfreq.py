@@ -0,0 +1,262 @@
+import hashlib
+import threading
+from calendar import monthrange
+from collections import Counter, defaultdict
+from datetime import date, timedelta
+
+import numpy as np
+
+from diary_cache import open_cache_db
+
+# 词 id 与词频统一以小端 int32 数组保存
+_DTYPE = '<i4'
+
+
+def day_signatures(items):
+    """
+    按日期计算文件签名（相对路径、大小、mtime），签名不变说明当天的词频无需重新计算
+    items 为 DiaryIndex.query 返回的 DiaryFile 列表
+    """
+    groups = defaultdict(list)
+    for item in items:
+        groups[item.date].append(f"{item.rel_path}\0{item.size}\0{item.mtime_ns}")
+    return {d: hashlib.sha1("\n".join(sorted(v)).encode('utf-8')).hexdigest() for d, v in groups.items()}
+
+
+def _month_key(year, month):
+    return year * 12 + month - 1
+
+
+def _split_range(start_date, end_date):
+    """
+    把日期区间拆成 (零散日期区间列表, 整月列表, 整年列表)
+    任意区间最多拆成 两段零散日期 + 少量整月 + 若干整年，合并次数与区间长度无关
+    """
+    day_spans, months, years = [], [], []
+    cur = start_date
+    while cur <= end_date:
+        if cur.month == 1 and cur.day == 1 and date(cur.year, 12, 31) <= end_date:
+            years.append(cur.year)
+            cur = date(cur.year + 1, 1, 1)
+            continue
+        month_last = date(cur.year, cur.month, monthrange(cur.year, cur.month)[1])
+        if cur.day == 1 and month_last <= end_date:
+            months.append(_month_key(cur.year, cur.month))
+            cur = month_last + timedelta(days=1)
+            continue
+        span_end = min(month_last, end_date)
+        day_spans.append((cur, span_end))
+        cur = span_end + timedelta(days=1)
+    return day_spans, months, years
+
+
+class WordFreqStore:
+    """
+    增量词频存储
+    - 词典表把词语映射为整数 id
+    - 每天的词频以 (id 数组, 次数数组) 的稀疏向量保存，并记录当天文件签名
+    - 按月、按年预先汇总，任意区间的词频只需合并 O(月数 + 年数) 个向量
+    """
+
+    def __init__(self, root_path, version):
+        self.root_path = root_path
+        self.version = version
+        self._lock = threading.Lock()
+        self._conn = open_cache_db(root_path)
+        with self._lock:
+            self._conn.execute("CREATE TABLE IF NOT EXISTS wf_terms (id INTEGER PRIMARY KEY, term TEXT UNIQUE NOT NULL)")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS wf_days (
+                    date INTEGER PRIMARY KEY, version TEXT NOT NULL, signature TEXT NOT NULL,
+                    ids BLOB NOT NULL, counts BLOB NOT NULL
+                )
+            """)
+            for table, key in (("wf_months", "month"), ("wf_years", "year")):
+                self._conn.execute(f"""
+                    CREATE TABLE IF NOT EXISTS {table} (
+                        {key} INTEGER PRIMARY KEY, version TEXT NOT NULL, ids BLOB NOT NULL, counts BLOB NOT NULL
+                    )
+                """)
+            self._conn.commit()
+        self._terms = []
+        self._term_ids = {}
+        with self._lock:
+            self._refresh_terms()
+
+    @property
+    def terms(self):
+        return self._terms
+
+    def _refresh_terms(self):
+        # 其他进程/连接可能追加了新词，按 id 增量读取
+        for term_id, term in self._conn.execute(
+                "SELECT id, term FROM wf_terms WHERE id >= ? ORDER BY id", (len(self._terms),)):
+            self._term_ids[term] = term_id
+            self._terms.append(term)
+
+    def _encode(self, counter):
+        """把 Counter 编码为按 id 排序的 (ids, counts) 数组，新词追加进词典"""
+        new_terms = [term for term in counter if term not in self._term_ids]
+        if new_terms:
+            start = len(self._terms)
+            self._conn.executemany("INSERT INTO wf_terms (id, term) VALUES (?, ?)",
+                                   [(start + i, term) for i, term in enumerate(new_terms)])
+            for term in new_terms:
+                self._term_ids[term] = len(self._terms)
+                self._terms.append(term)
+        ids = np.fromiter((self._term_ids[term] for term in counter), dtype=np.int64, count=len(counter))
+        counts = np.fromiter(counter.values(), dtype=np.int64, count=len(counter))
+        order = np.argsort(ids)
+        return ids[order], counts[order]
+
+    def _sum_rows(self, rows):
+        """把若干 (ids, counts) 行合并为长度等于词典大小的稠密向量"""
+        size = len(self._terms)
+        if not rows:
+            return np.zeros(size, dtype=np.int64)
+        ids = np.concatenate([np.frombuffer(r[0], dtype=_DTYPE) for r in rows])
+        counts = np.concatenate([np.frombuffer(r[1], dtype=_DTYPE) for r in rows])
+        return np.bincount(ids, weights=counts, minlength=size).astype(np.int64)
+
+    def _write_vector(self, table, key, key_value, vector):
+        ids = np.flatnonzero(vector)
+        if not len(ids):
+            self._conn.execute(f"DELETE FROM {table} WHERE {key} = ?", (key_value,))
+            return
+        self._conn.execute(
+            f"INSERT OR REPLACE INTO {table} ({key}, version, ids, counts) VALUES (?, ?, ?, ?)",
+            (key_value, self.version, ids.astype(_DTYPE).tobytes(), vector[ids].astype(_DTYPE).tobytes())
+        )
+
+    def stale_days(self, signatures):
+        """返回签名或分析版本与存储不一致（含尚未存储）的日期集合"""
+        if not signatures:
+            return set()
+        lo = min(signatures).toordinal()
+        hi = max(signatures).toordinal()
+        with self._lock:
+            stored = dict(
+                (date.fromordinal(d), sig) for d, sig in self._conn.execute(
+                    "SELECT date, signature FROM wf_days WHERE date BETWEEN ? AND ? AND version = ?",
+                    (lo, hi, self.version)
+                )
+            )
+        return {d for d, sig in signatures.items() if stored.get(d) != sig}
+
+    def sync(self, signatures, day_counters, ranges):
+        """
+        写入有变化的日期并刷新受影响的月、年汇总
+        signatures: 各区间内所有日期的当前签名
+        day_counters: 需要写入的日期 -> 当天合计 Counter（至少覆盖 stale_days 的结果）
+        ranges: [(start_date, end_date)]，区间内存储了但已不存在的日期会被删除
+        """
+        with self._lock:
+            # 先取得写锁再读取词典，避免多个连接分配出相同的词 id
+            self._conn.execute("BEGIN IMMEDIATE")
+            term_count = len(self._terms)
+            try:
+                self._refresh_terms()
+                self._sync_locked(signatures, day_counters, ranges)
+                self._conn.commit()
+            except Exception:
+                self._conn.rollback()
+                # 回滚后词典中新分配的 id 作废
+                for term in self._terms[term_count:]:
+                    del self._term_ids[term]
+                del self._terms[term_count:]
+                raise
+
+    def _sync_locked(self, signatures, day_counters, ranges):
+        touched = set(day_counters)
+        for d, counter in day_counters.items():
+            ids, counts = self._encode(counter)
+            self._conn.execute(
+                "INSERT OR REPLACE INTO wf_days (date, version, signature, ids, counts) VALUES (?, ?, ?, ?, ?)",
+                (d.toordinal(), self.version, signatures[d],
+                 ids.astype(_DTYPE).tobytes(), counts.astype(_DTYPE).tobytes())
+            )
+
+        for start_date, end_date in ranges:
+            lo = start_date.toordinal() if start_date else 0
+            hi = end_date.toordinal() if end_date else 10 ** 9
+            for (ordinal,) in self._conn.execute(
+                    "SELECT date FROM wf_days WHERE date BETWEEN ? AND ?", (lo, hi)).fetchall():
+                d = date.fromordinal(ordinal)
+                if d not in signatures:
+                    self._conn.execute("DELETE FROM wf_days WHERE date = ?", (ordinal,))
+                    touched.add(d)
+
+        months = {(d.year, d.month) for d in touched}
+        for year, month in months:
+            first = date(year, month, 1).toordinal()
+            last = date(year, month, monthrange(year, month)[1]).toordinal()
+            rows = self._conn.execute(
+                "SELECT ids, counts FROM wf_days WHERE date BETWEEN ? AND ? AND version = ?",
+                (first, last, self.version)
+            ).fetchall()
+            self._write_vector("wf_months", "month", _month_key(year, month), self._sum_rows(rows))
+
+        for year in {year for year, _ in months}:
+            rows = self._conn.execute(
+                "SELECT ids, counts FROM wf_months WHERE month BETWEEN ? AND ? AND version = ?",
+                (_month_key(year, 1), _month_key(year, 12), self.version)
+            ).fetchall()
+            self._write_vector("wf_years", "year", year, self._sum_rows(rows))
+
+    def range_vector(self, start_date=None, end_date=None):
+        """返回区间内的词频向量（下标为词 id），区间端点为 None 时取已存储的最早/最晚日期"""
+        with self._lock:
+            self._refresh_terms()
+            if start_date is None or end_date is None:
+                lo, hi = self._conn.execute(
+                    "SELECT MIN(date), MAX(date) FROM wf_days WHERE version = ?", (self.version,)
+                ).fetchone()
+                if lo is None:
+                    return np.zeros(len(self._terms), dtype=np.int64)
+                start_date = start_date or date.fromordinal(lo)
+                end_date = end_date or date.fromordinal(hi)
+
+            day_spans, months, years = _split_range(start_date, end_date)
+            rows = []
+            for first, last in day_spans:
+                rows += self._conn.execute(
+                    "SELECT ids, counts FROM wf_days WHERE date BETWEEN ? AND ? AND version = ?",
+                    (first.toordinal(), last.toordinal(), self.version)
+                ).fetchall()
+            for table, key, values in (("wf_months", "month", months), ("wf_years", "year", years)):
+                if values:
+                    placeholders = ",".join("?" * len(values))
+                    rows += self._conn.execute(
+                        f"SELECT ids, counts FROM {table} WHERE {key} IN ({placeholders}) AND version = ?",
+                        (*values, self.version)
+                    ).fetchall()
+            return self._sum_rows(rows)
+
+    def range_counter(self, start_date=None, end_date=None):
+        """返回区间内的完整词频 Counter"""
+        return self.vector_counter(self.range_vector(start_date, end_date))
+
+    def vector_counter(self, vector):
+        """把 range_vector 返回的词频向量转换为 Counter"""
+        ids = np.flatnonzero(vector)
+        return Counter(dict(zip([self._terms[i] for i in ids], vector[ids].tolist())))
+
+    def day_rows(self, start_date=None, end_date=None):
+        """
+        按日期顺序返回区间内每天的稀疏词频 [(日期序数, ids, counts)]
+        ids/counts 为按词 id 排序的 int64 数组，用于构建 词语 × 日期 矩阵
+        """
+        lo = start_date.toordinal() if start_date else 0
+        hi = end_date.toordinal() if end_date else 10 ** 9
+        with self._lock:
+            self._refresh_terms()
+            rows = self._conn.execute(
+                "SELECT date, ids, counts FROM wf_days WHERE date BETWEEN ? AND ? AND version = ? ORDER BY date",
+                (lo, hi, self.version)
+            ).fetchall()
+        return [(ordinal, np.frombuffer(ids, dtype=_DTYPE).astype(np.int64),
+                 np.frombuffer(counts, dtype=_DTYPE).astype(np.int64)) for ordinal, ids, counts in rows]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
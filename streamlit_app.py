@@ -1,17 +1,27 @@
 import os
+import time
 import streamlit as st
 import pandas as pd
-from datetime import datetime, date
-from diary_stats import collect_diary_data, add_stopwords
-from wordcloud import WordCloud
-import matplotlib.pyplot as plt
+from datetime import date, timedelta
+from utils.startup_utils import timed, format_timings
+from utils.perf_utils import get_profiler, last_runs, set_profiler
+with timed("导入 diary_stats"):
+    from diary_stats import collect_diary_data, collect_diary_data_multi, add_stopwords
+from diary_tokenizer import prewarm_jieba
+from diary_index import get_diary_index
+from diary_stopwords import get_stopword_service
+from diary_watcher import DiaryWatcher
+from diary_search import search, make_snippet
+from diary_trends import build_term_trends
+from diary_compare import compare_results
+from diary_export import dataset_summary, default_export_dir, export_dataset, load_dataset, manifest_mtime_ns
+from diary_multiroot import (DEFAULT_CHUNK_FILES, DEFAULT_PER_ROOT_LIMIT, DEFAULT_WORKERS, iter_collect_roots,
+                             load_roots, merge_results)
+from concurrent.futures import wait, FIRST_COMPLETED
+from diary_wordcloud import submit_wordcloud_image, submit_compare_image
 import yaml
 import altair as alt
 
-plt.rcParams['figure.dpi'] = 200
-plt.rcParams['font.sans-serif'] = ['SimHei']
-plt.rcParams['axes.unicode_minus'] = False
-
 
 # todo 长图保存，生成pdf，接入ai
 # todo 创建一个font文件夹，把字体文件存进去，代码里写相对路径
@@ -31,32 +41,197 @@ def save_config(config):
         yaml.dump(config, f, allow_unicode=True)
 
 
-def generate_wordcloud(word_freq):
-    freq_dict = dict(word_freq)
-    # 自动选择可用字体（支持中英文）
-    font_candidates = [
-        r"C:/Windows/Fonts/msyh.ttc",  # Windows
-        r"/System/Library/Fonts/PingFang.ttc",  # macOS
-        r"/usr/share/fonts/truetype/noto/NotoSansCJK-Regular.ttc",  # Linux
-    ]
-    font_path = next((f for f in font_candidates if os.path.isfile(f)), None)
+def submit_with_preview(submit, *args, **kwargs):
+    """
+    提交后台渲染，返回由低到高分辨率排列的 ImageJob 列表
+    完整尺寸的图片已在缓存中时不再生成预览图
+    """
+    full = submit(*args, **kwargs)
+    if full.future.done():
+        return [full]
+    return [submit(*args, preview=True, **kwargs), full]
+
+
+def fill_images(image_slots):
+    """
+    按完成顺序把后台渲染的图片填入占位符
+    image_slots：[(占位符, [ImageJob, ...])]，同一占位符中分辨率更高的图片完成后不会再被预览图覆盖
+    """
+    shown = {}
+    waiting = {}
+    for slot, (placeholder, jobs) in enumerate(image_slots):
+        for level, job in enumerate(jobs):
+            waiting.setdefault(job.future, []).append((slot, level))
+
+    while waiting:
+        done, _ = wait(list(waiting), return_when=FIRST_COMPLETED)
+        for future in done:
+            for slot, level in waiting.pop(future):
+                if shown.get(slot, -1) > level:
+                    continue
+                placeholder = image_slots[slot][0]
+                try:
+                    placeholder.image(future.result(), use_container_width=True)
+                except Exception as e:
+                    placeholder.warning(f"图片生成失败：{e}")
+                shown[slot] = level
+
+
+# ---- 缓存层 ----
+# 数据结果以 (根目录, 日期区间, 停用词版本, 语料指纹) 为键：只要日记文件和停用词不变，
+# 任何控件操作引起的重跑都直接复用结果；文件一旦增删改，指纹变化即自动失效
+
+@st.cache_data(ttl=30, max_entries=64, show_spinner=False)
+def corpus_fingerprint(root_path, start_date, end_date, refresh_token=0):
+    # 指纹本身也短暂缓存，点击"重新扫描"时通过 refresh_token 立即重新计算
+    return get_diary_index(root_path).fingerprint(start_date, end_date)
+
+
+@st.cache_data(ttl=3600, max_entries=32, show_spinner="正在统计日记...")
+def cached_collect_diary_data(root_path, stopwords_path, start_date, end_date, stopwords_version, fingerprint):
+    return collect_diary_data(root_path, stopwords_path, start_date, end_date)
+
+
+@st.cache_data(ttl=3600, max_entries=16, show_spinner="正在统计对比区间...")
+def cached_collect_diary_data_multi(root_path, stopwords_path, date_ranges, stopwords_version, fingerprints):
+    # 同时取得各区间的完整词频向量，区间对比直接使用，不再重新同步
+    return collect_diary_data_multi(root_path, list(date_ranges), stopwords_path, word_vectors=True)
+
+
+@st.cache_data(ttl=3600, max_entries=4, show_spinner=False)
+def cached_dataset_summary(export_dir, manifest_mtime):
+    # 直接加载导出的列式数据集（无需重新分词），重新导出后清单时间变化，缓存随之失效
+    start = time.perf_counter()
+    data = load_dataset(export_dir)
+    return dataset_summary(data), time.perf_counter() - start
+
+
+# 同时保持监听的根目录数上限：切换过的根目录（包括输错的路径）超出后，最久未使用的监听被停止
+WATCHER_MAX_ROOTS = 4
+
+
+def stop_diary_watcher(watcher):
+    # 监听被移出缓存时停止其 observer 和更新线程
+    if watcher is not None:
+        watcher.stop()
+
+
+@st.cache_resource(max_entries=WATCHER_MAX_ROOTS, show_spinner=False, on_release=stop_diary_watcher)
+def get_diary_watcher(root_path, stopwords_path):
+    # 每个根目录一个后台监听：日记被修改后立即增量更新缓存，界面缓存也随之失效，无需等待指纹过期
+    watcher = DiaryWatcher(root_path, stopwords_path)
+    try:
+        watcher.start(initial_sync=False)
+    except Exception:
+        watcher.stop()
+        return None
+    return watcher
 
-    wc = WordCloud(
-        font_path=font_path,
-        width=800,
-        height=400,
-        background_color='white'
-    ).generate_from_frequencies(freq_dict)
-    return wc
+
+def current_refresh_token(root_path, stopwords_path):
+    watcher = get_diary_watcher(root_path, stopwords_path)
+    return st.session_state.get('refresh_token', 0), watcher.generation if watcher else 0
+
+
+def load_diary_data(root_path, stopwords_path, start_date, end_date):
+    stopwords_version = get_stopword_service(stopwords_path).version
+    fingerprint = corpus_fingerprint(root_path, start_date, end_date,
+                                     current_refresh_token(root_path, stopwords_path))
+    return cached_collect_diary_data(root_path, stopwords_path, start_date, end_date, stopwords_version, fingerprint)
+
+
+@st.cache_resource(ttl=3600, max_entries=4, show_spinner="正在构建词语趋势...")
+def cached_term_trends(root_path, stopwords_path, stopwords_version, fingerprint):
+    # 趋势矩阵只读，直接复用对象；整个日记库的指纹变化后重新构建（只同步有变化的日期）
+    return build_term_trends(root_path, stopwords_path=stopwords_path)
+
+
+def load_term_trends(root_path, stopwords_path):
+    stopwords_version = get_stopword_service(stopwords_path).version
+    fingerprint = corpus_fingerprint(root_path, None, None, current_refresh_token(root_path, stopwords_path))
+    return cached_term_trends(root_path, stopwords_path, stopwords_version, fingerprint)
+
+
+def load_diary_data_multi(root_path, stopwords_path, date_ranges):
+    stopwords_version = get_stopword_service(stopwords_path).version
+    refresh_token = current_refresh_token(root_path, stopwords_path)
+    fingerprints = tuple(corpus_fingerprint(root_path, s, e, refresh_token) for s, e in date_ranges)
+    return cached_collect_diary_data_multi(root_path, stopwords_path, tuple(date_ranges), stopwords_version,
+                                           fingerprints)
 
 
 CONFIG_PATH = "config.yaml"
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 config = load_config(CONFIG_PATH)
 default_root_path = config.get('base_path', '')
+# config.yaml 中 profiler: cprofile / pyinstrument 开启性能剖析（也可用环境变量 DIARY_PROFILER）
+if config.get('profiler'):
+    set_profiler(config['profiler'])
 
 
 def main():
+    # jieba 词典在后台加载，不阻塞页面首次渲染
+    prewarm_jieba()
+    # 词云等图片在后台线程渲染：页面先输出统计和表格，最后按完成顺序填入图片
+    image_slots = []
+    render_page(image_slots)
+    fill_images(image_slots)
+    # 放在最后：本次运行中完成的统计和词云渲染都已记录
+    render_perf_panel()
+
+
+def render_roots_overview(config, roots):
+    """并发分析 config.yaml 中的全部根目录，按完成顺序逐行展示，并给出合并后的高频词"""
+    with st.expander("👥 多根目录概览"):
+        st.caption(f"共 {len(roots)} 个根目录；进程数、每个根目录的并发上限由 config.yaml 的 "
+                   "root_workers / root_limit 设置")
+        if not st.button("分析全部根目录"):
+            return
+        rows = []
+        table = st.empty()
+        results = []
+        for r in iter_collect_roots(roots,
+                                    workers=config.get('root_workers') or DEFAULT_WORKERS,
+                                    per_root_limit=config.get('root_limit') or DEFAULT_PER_ROOT_LIMIT,
+                                    chunk_files=config.get('root_chunk_files') or DEFAULT_CHUNK_FILES):
+            results.append(r)
+            rollup = r.result["daily_rollup"] if r.result is not None else None
+            rows.append({
+                "根目录": r.root.name,
+                "篇数": len(r.result["dataframe"]) if r.result is not None else 0,
+                "字数": int(rollup['字数'].sum()) if rollup is not None and not rollup.empty else 0,
+                "耗时 (s)": round(r.seconds, 2),
+                "错误": str(r.error) if r.error is not None else "",
+            })
+            table.dataframe(pd.DataFrame(rows), use_container_width=True, hide_index=True)
+        merged = merge_results(results)
+        if merged["word_freq"]:
+            st.markdown("**全部根目录合并后的高频词：**")
+            st.dataframe(pd.DataFrame(merged["word_freq"][:30], columns=["词语", "频率"]), use_container_width=True)
+
+
+def render_perf_panel():
+    with st.expander("🔬 性能分析（最近一次运行）"):
+        runs = last_runs()
+        st.caption(f"剖析器：{get_profiler() or '未开启（config.yaml 中设置 profiler: cprofile 或 pyinstrument）'}。"
+                   "命中页面缓存时不会重新统计，这里显示的是最近一次实际执行的结果；"
+                   "并行分析时读取/清洗/分词为各进程耗时之和，占比可能超过 100%")
+        if not runs:
+            st.text("暂无记录")
+        for run in runs:
+            st.markdown(f"**{run['name']}**：共 {run['total'] * 1000:.0f} ms（{run['finished']:%H:%M:%S}）")
+            if run['stages']:
+                stages_df = pd.DataFrame(list(run['stages'].items()), columns=["阶段", "耗时 (ms)"])
+                stages_df["耗时 (ms)"] = (stages_df["耗时 (ms)"] * 1000).round(1)
+                stages_df["占比"] = (stages_df["耗时 (ms)"] / (run['total'] * 1000 or 1)).map("{:.0%}".format)
+                st.dataframe(stages_df, use_container_width=True, hide_index=True)
+            if run['counters']:
+                st.text("  ".join(f"{name}: {n}" for name, n in run['counters'].items()))
+            if run['profile']:
+                st.code(run['profile'], language=None)
+
+
+def render_page(image_slots):
     st.title("📔 日记统计与词云分析")
     # 初始化 session_state，避免 KeyError
     if 'filter_mode' not in st.session_state:
@@ -80,8 +255,16 @@ def main():
     # 清除按钮
     # TODO 按钮没用，因为浏览器根本不会保存数据
 
-    # 根目录输入
-    root_path = st.text_input("📁 日记根目录（请粘贴或输入完整路径）", value=default_root, key='root_path')
+    # 多根目录部署：config.yaml 中配置了 roots 时可直接选择
+    roots = load_roots(config) if config.get('roots') else []
+    root_choice = None
+    if roots:
+        root_choice = st.selectbox("👥 选择日记根目录", ["手动输入"] + [r.name for r in roots], key='root_choice')
+    if root_choice and root_choice != "手动输入":
+        root_path = next(r.path for r in roots if r.name == root_choice)
+    else:
+        # 根目录输入
+        root_path = st.text_input("📁 日记根目录（请粘贴或输入完整路径）", value=default_root, key='root_path')
     if not root_path or not os.path.isdir(root_path):
         st.warning("请输入有效的日记根目录路径！")
         st.stop()
@@ -215,8 +398,12 @@ def main():
         start_date = date(selected_year, 1, 1)
         end_date = date(selected_year, 12, 31)
 
-    # 调用后端采集数据
-    results = collect_diary_data(root_path, stopwords_path, start_date, end_date)
+    # 重新扫描：只重新计算语料指纹，日记未变化时仍然命中缓存
+    if st.button("🔄 重新扫描日记"):
+        st.session_state['refresh_token'] = st.session_state.get('refresh_token', 0) + 1
+
+    # 调用后端采集数据（带缓存）
+    results = load_diary_data(root_path, stopwords_path, start_date, end_date)
     df = results["dataframe"]
     char_by_year = results.get("char_count_by_year", {})
     char_by_month = results.get("char_count_by_month", {})
@@ -258,19 +445,93 @@ def main():
     # 生成词云
     if word_freq:
         st.subheader("☁️ 词云图")
-        wc = generate_wordcloud(word_freq)
-        fig, ax = plt.subplots(figsize=(10, 5))
-        ax.imshow(wc, interpolation='bilinear')
-        ax.axis("off")
-        st.pyplot(fig)
-
-        # 保存词云到文件，供分享
-        save_dir = os.path.join(root_path, "wordclouds")
-        os.makedirs(save_dir, exist_ok=True)
-        timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
-        wc_path = os.path.join(save_dir, f"wordcloud_{timestamp}.png")
-        wc.to_file(wc_path)
-        st.markdown(f"[点击下载或分享词云图]({wc_path})")
+        # 词云按内容缓存在 wordclouds 目录，词频不变时直接复用已保存的图片，供展示和分享
+        wc_jobs = submit_with_preview(submit_wordcloud_image, os.path.join(root_path, "wordclouds"), word_freq)
+        image_slots.append((st.empty(), wc_jobs))
+        st.markdown(f"[点击下载或分享词云图]({wc_jobs[-1].path})")
+
+    # === 🔍 全文检索 ===
+    st.subheader("🔍 全文检索")
+    query = st.text_input("输入关键词（空格分隔表示同时包含，OR 表示任一，双引号表示短语）", key='search_query')
+    if query.strip():
+        in_range = st.checkbox("只在当前筛选的日期范围内搜索", value=True, key='search_in_range')
+        hits = search(root_path, query, start_date if in_range else None, end_date if in_range else None, limit=50)
+        if hits:
+            st.markdown(f"找到 **{len(hits)}** 篇相关日记（按相关度排序，最多显示 50 篇）")
+            st.dataframe(pd.DataFrame({
+                "日期": [hit.date.strftime('%Y-%m-%d') for hit in hits],
+                "文件": [hit.rel_path for hit in hits],
+                "相关度": [hit.score for hit in hits],
+                "命中次数": [hit.matches for hit in hits],
+                "摘要": [make_snippet(root_path, hit, query) for hit in hits],
+            }), use_container_width=True)
+        else:
+            st.info("没有找到匹配的日记")
+
+    # === 📈 词语趋势 ===
+    st.subheader("📈 词语趋势")
+    # 趋势统计整个日记库（冷启动时要为全部日记分词），打开开关后才构建，平时页面只分析所选区间的文件
+    if st.toggle("显示词语趋势（统计整个日记库）", key='show_trends'):
+        trends = load_term_trends(root_path, stopwords_path)
+        default_terms = " ".join(word for word, _ in word_freq[:3])
+        trend_terms = st.text_input("要查看的词语（空格分隔）", value=default_terms, key='trend_terms').split()
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            freq_label = st.selectbox("粒度", ["按日", "按周", "按月"], index=2, key='trend_freq')
+        with col2:
+            window = st.number_input("滑动平均（周期数）", min_value=1, max_value=30, value=1, key='trend_window')
+        with col3:
+            relative = st.checkbox("按每千词归一化", key='trend_relative')
+        if trend_terms and len(trends.dates):
+            freq = {"按日": 'D', "按周": 'W', "按月": 'M'}[freq_label]
+            trend_df = trends.frame(trend_terms, freq, int(window), relative)
+            chart_df = trend_df.reset_index().melt('日期', var_name='词语', value_name='频率')
+            chart = alt.Chart(chart_df).mark_line().encode(
+                x=alt.X("日期:T"),
+                y=alt.Y("频率:Q"),
+                color="词语:N",
+                tooltip=["日期:T", "词语", alt.Tooltip("频率:Q", format=".2f")]
+            ).properties(height=350)
+            st.altair_chart(chart, use_container_width=True)
+
+        # 当前区间与紧邻的上一段同长度区间相比，出现频率变化最大的词语
+        if start_date and end_date:
+            prev_end = start_date - timedelta(days=1)
+            prev_start = prev_end - (end_date - start_date)
+            movers = trends.top_movers((prev_start, prev_end), (start_date, end_date), k=10)
+            if not movers.empty:
+                st.markdown(f"**与上一段同长度区间（{prev_start} ~ {prev_end}）相比变化最大的词语：**")
+                st.dataframe(movers, use_container_width=True)
+
+    if roots:
+        render_roots_overview(config, roots)
+
+    # 列式数据集：其他工具可直接查询，重新加载时无需重新分词
+    with st.expander("📦 导出分析数据（Feather / Parquet）"):
+        export_format = st.radio("格式", ["feather", "parquet"], horizontal=True, key='export_format',
+                                 help="Feather 不压缩，加载最快；Parquet 体积小，便于其他工具读取")
+        st.caption(f"导出到 {default_export_dir(root_path)}，只重新写入有变化的年份")
+        if st.button("导出"):
+            try:
+                with st.spinner("正在导出..."):
+                    exported = export_dataset(root_path, stopwords_path=stopwords_path, fmt=export_format)
+                st.success(f"导出完成（{exported['seconds']:.2f}s）：写入 {exported['written'] or '无'}，"
+                           f"未变化 {exported['unchanged'] or '无'}")
+            except ImportError as e:
+                st.error(str(e))
+        export_dir = default_export_dir(root_path)
+        manifest_mtime = manifest_mtime_ns(export_dir)
+        if manifest_mtime is not None:
+            try:
+                summary, load_seconds = cached_dataset_summary(export_dir, manifest_mtime)
+                st.markdown(f"**已导出的数据集**（加载耗时 {load_seconds * 1000:.1f} ms）")
+                st.dataframe(summary, use_container_width=True)
+            except ImportError as e:
+                st.error(str(e))
+
+    with st.expander("⏱ 启动与初始化耗时"):
+        for line in format_timings():
+            st.text(line)
 
     # === 📈 区间对比分析模块 ===
     st.subheader("📊 区间对比分析")
@@ -350,8 +611,10 @@ def main():
         compare_start_2, compare_end_2 = select_date_range("区间2")
 
         if compare_start_1 and compare_end_1 and compare_start_2 and compare_end_2:
-            result_1 = collect_diary_data(root_path, stopwords_path, compare_start_1, compare_end_1)
-            result_2 = collect_diary_data(root_path, stopwords_path, compare_start_2, compare_end_2)
+            # 两个区间一次遍历完成，重叠部分的文件只分析一次
+            result_1, result_2 = load_diary_data_multi(
+                root_path, stopwords_path, [(compare_start_1, compare_end_1), (compare_start_2, compare_end_2)]
+            )
 
             df1 = result_1["dataframe"]
             if df1.empty or '字数' not in df1.columns:
@@ -386,43 +649,28 @@ def main():
             # 对比词云
             st.markdown("☁️ 高频词对比（Top 100）")
 
-            word_freq_1 = dict(result_1.get("word_freq", [])[:100])
-            word_freq_2 = dict(result_2.get("word_freq", [])[:100])
-
-            # 合并两个词典，计算词频差异
-            all_words = set(word_freq_1.keys()) | set(word_freq_2.keys())
-            diff_data = {
-                "词汇": [],
-                "区间1频率": [],
-                "区间2频率": [],
-                "变化": []
-            }
-
-            for word in sorted(all_words):
-                freq1 = word_freq_1.get(word, 0)
-                freq2 = word_freq_2.get(word, 0)
-                diff_data["词汇"].append(word)
-                diff_data["区间1频率"].append(freq1)
-                diff_data["区间2频率"].append(freq2)
-                diff_data["变化"].append(freq2 - freq1)
-
-            diff_df = pd.DataFrame(diff_data).sort_values("变化", ascending=False)
+            sort_by = st.selectbox("排序依据", ["对数几率", "变化", "相对变化"], key='compare_sort_by',
+                                   help="对数几率兼顾变化幅度和出现次数；相对变化按词频占比计算")
+            # 完整词频向量对齐后比较，不再只看两边各自的 Top 100
+            diff_df = compare_results(result_1, result_2, k=100, sort_by=sort_by)
             st.dataframe(diff_df, use_container_width=True)
 
             # 生成两个词云图
             st.markdown("☁️ 词云图对比")
 
             # --- 词云图部分 ---
-            fig, axes = plt.subplots(1, 2, figsize=(14, 6))
-            wc1 = generate_wordcloud(result_1["word_freq"])
-            wc2 = generate_wordcloud(result_2["word_freq"])
-            axes[0].imshow(wc1, interpolation='bilinear')
-            axes[0].axis("off")
-            axes[0].set_title("区间1")
-            axes[1].imshow(wc2, interpolation='bilinear')
-            axes[1].axis("off")
-            axes[1].set_title("区间2")
-            st.pyplot(fig)
+            # 单张词云与主页面共用 wordclouds 缓存，拼接后的对比图缓存在 compare_clouds
+            wordcloud_dir = os.path.join(root_path, "wordclouds")
+            wc1_jobs = submit_with_preview(submit_wordcloud_image, wordcloud_dir, result_1["word_freq"])
+            wc2_jobs = submit_with_preview(submit_wordcloud_image, wordcloud_dir, result_2["word_freq"])
+            # 对比图在两张词云完成后拼接；词云有预览图时，对比图也先用预览图低分辨率拼一张
+            compare_dir = os.path.join(root_path, "compare_clouds")
+            titles = ("区间1", "区间2")
+            compare_jobs = [submit_compare_image(compare_dir, [wc1_jobs[-1], wc2_jobs[-1]], titles)]
+            if not compare_jobs[0].future.done() and (len(wc1_jobs) > 1 or len(wc2_jobs) > 1):
+                compare_jobs.insert(0, submit_compare_image(compare_dir, [wc1_jobs[0], wc2_jobs[0]], titles,
+                                                            preview=True))
+            image_slots.append((st.empty(), compare_jobs))
 
             # --- 条形图部分 ---
             st.markdown("📊 高频词对比（Top 30）")
@@ -447,12 +695,7 @@ def main():
 
             st.altair_chart(chart, use_container_width=True)
 
-            # 保存对比图
-            compare_dir = os.path.join(root_path, "compare_clouds")
-            os.makedirs(compare_dir, exist_ok=True)
-            compare_path = os.path.join(compare_dir, f"compare_wordclouds_{timestamp}.png")
-            fig.savefig(compare_path, bbox_inches='tight')
-            st.markdown(f"[📥 下载词云对比图]({compare_path})")
+            st.markdown(f"[📥 下载词云对比图]({compare_jobs[-1].path})")
 
 
 if __name__ == "__main__":
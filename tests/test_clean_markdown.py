@@ -0,0 +1,61 @@
+"""
+clean_markdown_text 的黄金输出测试：对照优化前逐步 re.sub 的实现，输出必须逐字节一致
+"""
+import os
+import re
+
+import pytest
+
+from diary_stats import clean_markdown_text
+
+TEMPLATE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'templates', 'default.md')
+
+
+def legacy_clean_markdown_text(markdown_text):
+    """优化前的实现"""
+    markdown_text = re.sub(r'<[^>]+>', '', markdown_text)
+    markdown_text = re.sub(r'!\[.*?\]\(.*?\)', '', markdown_text)
+    markdown_text = re.sub(r'\[([^\]]+)\]\(https?://[^\)]+\)', r'\1', markdown_text)
+    markdown_text = re.sub(r'https?://[^\s\)]+', '', markdown_text)
+    markdown_text = re.sub(r'\n{3,}', '\n\n', markdown_text)
+    return markdown_text.strip()
+
+
+# 各清洗步骤相互影响的边界情况
+FIXTURES = [
+    "",
+    "   \n\n",
+    "# 20250716\n\n## 今日计划\n- 今天我完成了哪些事情？",
+    "今天天气很好，我们一起去公园散步。\nWorked on some Python code today.",
+    "<b>加粗</b> 和 <br/> 换行 <不闭合",
+    "<span style=\"color:red\">重点</span>",
+    "![图片](http://a.com/x.png) 图后文字 ![](local.png)",
+    "![a](<b>x)",
+    "[链接文字](https://example.com/path) 后面",
+    "[te<i>x</i>t](https://example.com)",
+    "[http://a.com](http://b.com)",
+    "http://a.com![x](y)",
+    "裸链接 https://example.com/a?b=1)后缀 http://x.y",
+    "参考 https://docs.python.org/3/ 文档",
+    "[不是链接](local.md) [空]() [](https://a.b)",
+    "a\n\n\nb\n\n\n\n\nc\r\n\r\n\r\nd",
+    "![跨\n行](url) [跨\n行](https://a.b)",
+    "<a href=\"https://a.b\">[x](https://c.d)</a>\n\n\n\n",
+]
+
+
+@pytest.mark.parametrize("text", FIXTURES)
+def test_matches_legacy(text):
+    assert clean_markdown_text(text).encode('utf-8') == legacy_clean_markdown_text(text).encode('utf-8')
+
+
+def test_template_matches_legacy():
+    with open(TEMPLATE_PATH, 'r', encoding='utf-8') as f:
+        text = f.read()
+    assert clean_markdown_text(text) == legacy_clean_markdown_text(text)
+
+
+def test_concatenated_fixtures_match_legacy():
+    # 多种标记混在同一篇日记中
+    text = "\n".join(FIXTURES * 3)
+    assert clean_markdown_text(text) == legacy_clean_markdown_text(text)
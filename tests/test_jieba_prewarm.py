@@ -0,0 +1,36 @@
+"""
+后台预热 jieba 的同时创建分析进程池：fork 出的子进程不能继承被占用的词典加载锁而永远阻塞
+在独立的解释器中运行（需要 jieba 尚未加载），超时即视为卡死
+"""
+import os
+import subprocess
+import sys
+from datetime import date, timedelta
+
+from diary_stats import PARALLEL_MIN_FILES
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SCRIPT = """
+import sys
+from diary_tokenizer import prewarm_jieba
+from diary_stats import collect_diary_data
+prewarm_jieba()
+result = collect_diary_data(sys.argv[1], use_cache=False, workers=2)
+print(len(result["dataframe"]))
+"""
+
+
+def test_prewarm_does_not_block_process_pool(tmp_path):
+    day = date(2024, 1, 1)
+    files = PARALLEL_MIN_FILES + 8
+    for _ in range(files):
+        path = tmp_path / str(day.year) / day.strftime('%Y%m') / day.strftime('%Y%m%d.md')
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(f"# {day:%Y%m%d}\n今天学习了 Python，天气很好。\n", encoding='utf-8')
+        day += timedelta(days=1)
+
+    proc = subprocess.run([sys.executable, "-c", SCRIPT, str(tmp_path)], cwd=REPO_ROOT,
+                          capture_output=True, text=True, timeout=60)
+    assert proc.returncode == 0, proc.stderr
+    assert proc.stdout.split()[-1] == str(files)
@@ -0,0 +1,81 @@
+"""
+DiaryWatcher 增量更新测试：在临时日记目录中新增、修改、删除 .md 文件，
+监听处理完毕后 stats() 应与不使用缓存的完整统计 collect_diary_data 一致
+"""
+import os
+import time
+
+import pandas as pd
+import pytest
+
+from diary_stats import collect_diary_data
+from diary_watcher import DiaryWatcher
+
+TIMEOUT = 20
+
+
+def write_diary(root, day, text):
+    path = os.path.join(root, day[:4], day[:6], f"{day}.md")
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(text)
+    return path
+
+
+def settle(watcher, generation):
+    # 等待监听发现变化并完成更新（轮询方式要到下一个轮询周期才能发现变化）
+    deadline = time.monotonic() + TIMEOUT
+    while watcher.generation == generation and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert watcher.generation > generation, "监听没有处理文件变化"
+    assert watcher.wait_idle(TIMEOUT)
+
+
+def assert_matches_full_scan(watcher, root):
+    stats = watcher.stats()
+    # 先取监听结果再完整统计：不使用缓存的统计不会写入日汇总表和词频存储
+    expected = collect_diary_data(root, use_cache=False)
+    pd.testing.assert_frame_equal(stats["daily_rollup"], expected["daily_rollup"], check_dtype=False,
+                                  check_freq=False)
+    assert dict(stats["word_freq"]) == dict(expected["word_freq"])
+
+
+@pytest.fixture
+def diary_root(tmp_path):
+    root = str(tmp_path)
+    write_diary(root, "20240101", "# 20240101\n今天去公园散步，天气很好。\n")
+    write_diary(root, "20240102", "# 20240102\n学习 Python 编程，写了一个小工具。\n")
+    write_diary(root, "20240215", "# 20240215\n和朋友一起吃饭，聊了很久。\n")
+    return root
+
+
+@pytest.mark.parametrize("use_watchdog", [False, True], ids=["polling", "watchdog"])
+def test_watcher_stats_follow_file_changes(diary_root, use_watchdog):
+    if use_watchdog:
+        pytest.importorskip("watchdog")
+    watcher = DiaryWatcher(diary_root, use_watchdog=use_watchdog, poll_interval=0.2, debounce=0.2)
+    watcher.start()
+    try:
+        assert_matches_full_scan(watcher, diary_root)
+
+        # 新增：同月新的一天，以及一个新的年/月目录
+        generation = watcher.generation
+        write_diary(diary_root, "20240103", "# 20240103\n下雨了，在家看书。\n")
+        write_diary(diary_root, "20250301", "# 20250301\n新的一年，新的计划。\n")
+        settle(watcher, generation)
+        assert_matches_full_scan(watcher, diary_root)
+
+        # 修改：内容和大小都变化
+        generation = watcher.generation
+        write_diary(diary_root, "20240101", "# 20240101\n今天去公园散步，天气很好。\n晚上又去跑步，跑了五公里。\n")
+        settle(watcher, generation)
+        assert_matches_full_scan(watcher, diary_root)
+
+        # 删除：当天不再有日记，日汇总表中对应的日期也应移除
+        generation = watcher.generation
+        os.remove(os.path.join(diary_root, "2024", "202402", "20240215.md"))
+        settle(watcher, generation)
+        assert_matches_full_scan(watcher, diary_root)
+        assert watcher.last_error is None
+    finally:
+        watcher.stop()
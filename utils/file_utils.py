@@ -1,9 +1,17 @@
-from datetime import datetime
+from datetime import datetime, timedelta
 import os
 import shutil
 
+from utils.perf_utils import count, recording, stage
+from utils.template_utils import load_template
 
-def create_diary_entry(base_path, filename_format=None, use_template=False, template_path=None):
+
+def create_diary_entry(base_path, filename_format=None, use_template=False, template_path=None, template_vars=None):
+    with recording('创建日记'):
+        return _create_diary_entry(base_path, filename_format, use_template, template_path, template_vars)
+
+
+def _create_diary_entry(base_path, filename_format, use_template, template_path, template_vars):
     today = datetime.today()
 
     if not filename_format:
@@ -16,26 +24,94 @@ def create_diary_entry(base_path, filename_format=None, use_template=False, temp
 
     year_dir = os.path.join(base_path, year)
     month_dir = os.path.join(year_dir, year_month)
-    os.makedirs(month_dir, exist_ok=True)
+    with stage('创建目录'):
+        os.makedirs(month_dir, exist_ok=True)
 
     target_file = os.path.join(month_dir, filename)
 
     if os.path.exists(target_file):
+        count('跳过')
         return f"📄 文件已存在: {target_file}"
 
-    if use_template and template_path and os.path.exists(template_path):
-        with open(template_path, "r", encoding="utf-8") as f:
-            content = f.read()
-        today_str = datetime.today().strftime("%Y%m%d")
-        content = content.replace("{{date}}", today_str)
-        with open(target_file, "w", encoding="utf-8") as f:
-            f.write(content)
+    with stage('加载模板'):
+        template = load_template(template_path) if use_template and template_path else None
+    if template:
+        with stage('渲染模板'):
+            content = template.render(today, template_vars, filename_format)
+        with stage('写入'):
+            with open(target_file, "w", encoding="utf-8") as f:
+                f.write(content)
 
     else:
-        with open(target_file, "w", encoding="utf-8") as f:
-            f.write("")
+        with stage('写入'):
+            with open(target_file, "w", encoding="utf-8") as f:
+                f.write("")
+    count('新建')
 
     return f"✅ 成功创建: {target_file}"
 
+def create_diary_entries(base_path, start_date, end_date, filename_format=None, use_template=False,
+                         template_path=None, template_vars=None):
+    """
+    批量创建 [start_date, end_date] 区间内每天的日记（补建历史日记、批量初始化目录）
+    - 模板只读取、编译一次，逐日只需渲染拼接
+    - 每个 YYYY/YYYYMM 目录只创建一次，已有文件通过一次目录列表判断后跳过
+    返回 (新建数量, 跳过数量)
+    """
+    if isinstance(start_date, datetime):
+        start_date = start_date.date()
+    if isinstance(end_date, datetime):
+        end_date = end_date.date()
+    if start_date > end_date:
+        return 0, 0
+
+    if not filename_format:
+        filename_format = "%Y%m%d.md"
+
+    with recording('批量创建日记'):
+        created, skipped = _create_entries(base_path, start_date, end_date, filename_format, use_template,
+                                           template_path, template_vars)
+        count('新建', created)
+        count('跳过', skipped)
+    return created, skipped
+
+
+def _create_entries(base_path, start_date, end_date, filename_format, use_template, template_path, template_vars):
+    with stage('加载模板'):
+        template = load_template(template_path) if use_template and template_path else None
+
+    created = skipped = 0
+    month_dir = None
+    existing = set()
+    day = start_date
+    one_day = timedelta(days=1)
+    while day <= end_date:
+        dir_path = os.path.join(base_path, day.strftime("%Y"), day.strftime("%Y%m"))
+        if dir_path != month_dir:
+            month_dir = dir_path
+            with stage('列举目录'):
+                os.makedirs(month_dir, exist_ok=True)
+                existing = set(os.listdir(month_dir))
+
+        filename = sanitize_filename(day.strftime(filename_format))
+        if filename in existing:
+            skipped += 1
+        else:
+            with stage('渲染模板'):
+                content = template.render(day, template_vars, filename_format) if template else ""
+            try:
+                # 'x' 模式：列目录之后若被其他进程抢先创建，也不会覆盖
+                with stage('写入'):
+                    with open(os.path.join(month_dir, filename), "x", encoding="utf-8") as f:
+                        f.write(content)
+                created += 1
+            except FileExistsError:
+                skipped += 1
+            existing.add(filename)
+        day += one_day
+
+    return created, skipped
+
+
 def sanitize_filename(name):
     return name.replace("/", "-").replace("\\", "-").strip()
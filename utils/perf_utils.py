@@ -0,0 +1,186 @@
+import io
+import os
+import time
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+
+# 各项操作（collect_diary_data、词云渲染、创建日记）最近一次的性能记录，按操作名保存
+LAST_RUNS = OrderedDict()
+_lock = threading.Lock()
+_local = threading.local()
+
+# 可选的性能剖析器：None / 'cprofile' / 'pyinstrument'，可由配置 profiler 或环境变量 DIARY_PROFILER 指定
+PROFILERS = ('cprofile', 'pyinstrument')
+_profiler = os.environ.get('DIARY_PROFILER') or None
+PROFILE_TOP = 30
+
+
+class PerfRecorder:
+    """一次操作的分阶段耗时（秒，同名阶段累加）和计数器"""
+
+    def __init__(self, name):
+        self.name = name
+        self.stages = OrderedDict()
+        self.counters = OrderedDict()
+        self.total = 0.0
+        self.profile = None
+        self.finished = None
+
+    def add_time(self, stage, seconds):
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def count(self, counter, n=1):
+        self.counters[counter] = self.counters.get(counter, 0) + n
+
+    def merge(self, stages, counters):
+        """合并其他进程/线程中记录的阶段和计数（例如进程池中各子进程的分析耗时）"""
+        for stage, seconds in stages.items():
+            self.add_time(stage, seconds)
+        for counter, n in counters.items():
+            self.count(counter, n)
+
+    def as_dict(self):
+        return {
+            'name': self.name,
+            'total': self.total,
+            'stages': dict(self.stages),
+            'counters': dict(self.counters),
+            'profile': self.profile,
+            'finished': self.finished,
+        }
+
+
+def set_profiler(name):
+    """设置剖析器，不认识的名字按关闭处理"""
+    global _profiler
+    name = (name or '').strip().lower() or None
+    _profiler = name if name in PROFILERS else None
+
+
+def get_profiler():
+    return _profiler
+
+
+def current_recorder():
+    return getattr(_local, 'recorder', None)
+
+
+@contextmanager
+def _profiling(recorder, profiler):
+    if profiler == 'cprofile':
+        import cProfile
+        import pstats
+        prof = cProfile.Profile()
+        try:
+            prof.enable()
+        except ValueError:
+            # 同一时刻只能有一个 cProfile 生效（例如另一个线程正在剖析）
+            yield
+            return
+        try:
+            yield
+        finally:
+            prof.disable()
+            out = io.StringIO()
+            pstats.Stats(prof, stream=out).sort_stats('cumulative').print_stats(PROFILE_TOP)
+            recorder.profile = out.getvalue()
+    elif profiler == 'pyinstrument':
+        try:
+            from pyinstrument import Profiler
+        except ImportError:
+            recorder.profile = "未安装 pyinstrument（pip install pyinstrument）"
+            yield
+            return
+        prof = Profiler()
+        try:
+            prof.start()
+        except RuntimeError:
+            yield
+            return
+        try:
+            yield
+        finally:
+            prof.stop()
+            recorder.profile = prof.output_text(unicode=True, color=False)
+    else:
+        yield
+
+
+@contextmanager
+def recording(name):
+    """
+    记录一次操作：期间本线程内的 stage()/count() 都计入该记录，结束后保存到 LAST_RUNS[name]
+    设置了剖析器时同时剖析整个操作
+    已在记录中时（例如 collect_diary_data_multi 内部）直接并入外层记录，各阶段不会重复计时
+    """
+    outer = current_recorder()
+    if outer is not None:
+        yield outer
+        return
+
+    recorder = PerfRecorder(name)
+    _local.recorder = recorder
+    start = time.perf_counter()
+    try:
+        with _profiling(recorder, _profiler):
+            yield recorder
+    finally:
+        _local.recorder = None
+        recorder.total = time.perf_counter() - start
+        recorder.finished = datetime.now()
+        with _lock:
+            LAST_RUNS.pop(name, None)
+            LAST_RUNS[name] = recorder.as_dict()
+
+
+@contextmanager
+def collecting(recorder):
+    """在本线程中把 stage()/count() 记入指定的记录（不保存到 LAST_RUNS），结束后恢复原来的记录"""
+    previous = current_recorder()
+    _local.recorder = recorder
+    try:
+        yield recorder
+    finally:
+        _local.recorder = previous
+
+
+@contextmanager
+def _timed_stage(recorder, name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        recorder.add_time(name, time.perf_counter() - start)
+
+
+def stage(name):
+    """计时一个阶段；当前线程没有进行中的记录时不做任何事"""
+    recorder = current_recorder()
+    if recorder is None:
+        return nullcontext()
+    return _timed_stage(recorder, name)
+
+
+def count(name, n=1):
+    recorder = current_recorder()
+    if recorder is not None:
+        recorder.count(name, n)
+
+
+def last_runs():
+    with _lock:
+        return list(LAST_RUNS.values())
+
+
+def format_perf(run):
+    """把一条性能记录格式化为文本行（命令行输出用）"""
+    lines = [f"{run['name']}: {run['total'] * 1000:.1f} ms"]
+    for name, seconds in run['stages'].items():
+        lines.append(f"  {name}: {seconds * 1000:.1f} ms")
+    for name, n in run['counters'].items():
+        lines.append(f"  {name} = {n}")
+    if run['profile']:
+        lines.append(run['profile'])
+    return lines
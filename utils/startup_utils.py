@@ -0,0 +1,35 @@
+import time
+import importlib
+import threading
+from contextlib import contextmanager
+
+# 启动/初始化阶段的耗时记录（秒），按首次发生的顺序保存
+STARTUP_TIMINGS = {}
+_lock = threading.Lock()
+
+
+def record_timing(name, seconds):
+    with _lock:
+        STARTUP_TIMINGS.setdefault(name, seconds)
+
+
+@contextmanager
+def timed(name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_timing(name, time.perf_counter() - start)
+
+
+def lazy_import(module_name):
+    """
+    首次使用时才导入重量级模块，并记录导入耗时
+    之后的调用直接从 sys.modules 取得，几乎没有开销
+    """
+    with timed(f"导入 {module_name}"):
+        return importlib.import_module(module_name)
+
+
+def format_timings():
+    return [f"{name}: {seconds * 1000:.0f} ms" for name, seconds in STARTUP_TIMINGS.items()]
@@ -0,0 +1,97 @@
+import os
+import re
+import threading
+from datetime import timedelta
+
+# 占位符：{{name}} 或 {{name:格式}}，格式为 strftime 格式，仅对日期类占位符生效
+_PLACEHOLDER_RE = re.compile(r'\{\{\s*(\w+)\s*(?::([^}]*))?\}\}')
+
+WEEKDAY_NAMES = ["星期一", "星期二", "星期三", "星期四", "星期五", "星期六", "星期日"]
+
+DEFAULT_FILENAME_FORMAT = "%Y%m%d.md"
+
+
+def _prev_link(day, fmt, filename_format):
+    # 前一天日记的相对链接，统一从 ../../ 回到根目录，跨月、跨年都能正确跳转
+    prev = day - timedelta(days=1)
+    name = prev.strftime(filename_format).replace("/", "-").replace("\\", "-").strip()
+    return f"[{prev.strftime(fmt or '%Y%m%d')}](../../{prev:%Y}/{prev:%Y%m}/{name})"
+
+
+# 内置占位符：(默认格式, 取值函数)，取值函数参数为 (日期, 格式, 文件名格式)
+BUILTIN_PLACEHOLDERS = {
+    "date": lambda day, fmt, _: day.strftime(fmt or "%Y%m%d"),
+    "year": lambda day, fmt, _: day.strftime(fmt or "%Y"),
+    "month": lambda day, fmt, _: day.strftime(fmt or "%m"),
+    "day": lambda day, fmt, _: day.strftime(fmt or "%d"),
+    "weekday": lambda day, fmt, _: day.strftime(fmt) if fmt else WEEKDAY_NAMES[day.weekday()],
+    "prev_date": lambda day, fmt, _: (day - timedelta(days=1)).strftime(fmt or "%Y%m%d"),
+    "prev_link": _prev_link,
+}
+
+
+class CompiledTemplate:
+    """
+    预编译的日记模板
+    模板文本只解析一次，拆成“固定文本 + 占位符”片段，逐日渲染时只做取值和拼接
+    未知的占位符原样保留
+    """
+
+    def __init__(self, text):
+        self.text = text
+        self._parts = []
+        self.placeholders = set()
+        pos = 0
+        for match in _PLACEHOLDER_RE.finditer(text):
+            if match.start() > pos:
+                self._parts.append(text[pos:match.start()])
+            name, fmt = match.group(1), match.group(2)
+            self._parts.append((name, fmt, match.group(0)))
+            self.placeholders.add(name)
+            pos = match.end()
+        if pos < len(text):
+            self._parts.append(text[pos:])
+
+    def render(self, day, variables=None, filename_format=None):
+        """按日期渲染模板，variables 为自定义变量（优先于内置占位符）"""
+        variables = variables or {}
+        filename_format = filename_format or DEFAULT_FILENAME_FORMAT
+        out = []
+        for part in self._parts:
+            if isinstance(part, str):
+                out.append(part)
+                continue
+            name, fmt, raw = part
+            if name in variables:
+                out.append(str(variables[name]))
+            elif name in BUILTIN_PLACEHOLDERS:
+                out.append(BUILTIN_PLACEHOLDERS[name](day, fmt, filename_format))
+            else:
+                out.append(raw)
+        return "".join(out)
+
+
+_templates = {}
+_templates_lock = threading.Lock()
+
+
+def load_template(template_path):
+    """
+    读取并编译模板，按 (路径, mtime, 大小) 缓存；文件被修改后自动重新编译
+    模板不存在时返回 None
+    """
+    path = os.path.abspath(template_path)
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    stamp = (stat.st_mtime_ns, stat.st_size)
+    with _templates_lock:
+        cached = _templates.get(path)
+        if cached and cached[0] == stamp:
+            return cached[1]
+    with open(path, "r", encoding="utf-8") as f:
+        template = CompiledTemplate(f.read())
+    with _templates_lock:
+        _templates[path] = (stamp, template)
+    return template